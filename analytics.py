@@ -0,0 +1,151 @@
+import sys
+import argparse
+
+import numpy as np
+
+from rules import NUM_DICE, DOMINO_VALUES
+from records import RecordReader, GAME, ROLL, TAKE, BUST, NO_PLAYER
+from state import MAX_PLAYERS
+
+# worms of each domino number, 0 for the numbers that are not a domino
+WORMS = np.zeros(256, np.int64)
+for _d, _v in DOMINO_VALUES.items():
+    WORMS[_d] = _v
+MAX_WORMS = sum(DOMINO_VALUES.values())
+
+
+def read_chunks(paths, games=100000):
+    """
+    :arg paths: list of game record files
+    :arg games: number of games per chunk
+
+    :returns a generator of the events of consecutive complete games, as arrays of records.EVENT_DTYPE
+    """
+    for path in paths:
+        with RecordReader(path) as reader:
+            yield from reader.chunks(games)
+
+
+def final_worms(events):
+    """
+    :arg events: events of complete games, as an array of records.EVENT_DTYPE
+
+    :returns a tuple (players, worms): the number of players of each game and an array of the worms of each player at
+        the end of each game, -1 for the seats of a game with fewer players
+    """
+    kind = events['kind']
+    game = np.cumsum(kind == GAME) - 1
+    starts = kind == GAME
+    players = events['player'][starts].astype(np.int64)
+    worms = np.zeros((len(players), MAX_PLAYERS), np.int64)
+
+    take = kind == TAKE
+    np.add.at(worms, (game[take], events['player'][take]), WORMS[events['a'][take]])
+    steal = take & (events['b'] != NO_PLAYER)
+    np.add.at(worms, (game[steal], events['b'][steal]), -WORMS[events['a'][steal]])
+    bust = kind == BUST
+    np.add.at(worms, (game[bust], events['player'][bust]), -WORMS[events['a'][bust]])
+
+    worms[np.arange(MAX_PLAYERS) >= players[:, None]] = -1
+    return players, worms
+
+
+def winners(worms):
+    """:returns a boolean array of the players with the most worms of each game, all of them when it is a tie"""
+    return worms == worms.max(axis=1, keepdims=True)
+
+
+class GameStats:
+    def __init__(self):
+        """
+        Initializes a GameStats object that adds up the statistics of the games in chunks of events, so any number of
+        games is analysed in constant memory. Arrays indexed by the number of players have length MAX_PLAYERS + 1
+        """
+        self.games = np.zeros(MAX_PLAYERS + 1, np.int64)
+        self.turns = 0
+        self.rolls = np.zeros(NUM_DICE + 1, np.int64)          # rolls by number of dice rolled
+        self.roll_busts = np.zeros(NUM_DICE + 1, np.int64)     # rolls without a face to choose
+        self.busts = 0                                          # turns lost, also after the last die or without worm
+        self.taken = np.zeros(37, np.int64)                     # dominos taken from the table, by domino number
+        self.stolen = np.zeros(37, np.int64)                    # dominos stolen, by domino number
+        self.first_wins = np.zeros(MAX_PLAYERS + 1, np.int64)   # games won by the first player alone
+        self.first_ties = np.zeros(MAX_PLAYERS + 1, np.int64)   # games the first player shares the most worms
+        self.first_share = np.zeros(MAX_PLAYERS + 1)            # wins of the first player, a shared win split equally
+        self.ties = np.zeros(MAX_PLAYERS + 1, np.int64)         # games with more than one winner
+        self.worms = np.zeros(MAX_WORMS + 1, np.int64)          # final worms of every player
+
+    def add(self, events):
+        """:arg events: events of complete games, as an array of records.EVENT_DTYPE"""
+        kind = events['kind']
+        rolls = np.flatnonzero(kind == ROLL)
+        packed = events['c'][rolls].astype(np.int64)
+        dice = sum(packed >> (4 * f) & 15 for f in range(6))
+        # a roll without a face to choose is followed right away by the end of the turn, a game always ends with END
+        busted = kind[rolls + 1] == BUST
+        self.rolls += np.bincount(dice, minlength=NUM_DICE + 1)
+        self.roll_busts += np.bincount(dice[busted], minlength=NUM_DICE + 1)
+
+        take = kind == TAKE
+        steal = events['b'][take] != NO_PLAYER
+        dominos = events['a'][take]
+        self.taken += np.bincount(dominos[~steal], minlength=37)
+        self.stolen += np.bincount(dominos[steal], minlength=37)
+        self.busts += int(np.count_nonzero(kind == BUST))
+        self.turns += int(np.count_nonzero(take)) + int(np.count_nonzero(kind == BUST))
+
+        players, worms = final_worms(events)
+        won = winners(worms)
+        n_winners = won.sum(axis=1)
+        self.games += np.bincount(players, minlength=MAX_PLAYERS + 1)
+        self.first_wins += np.bincount(players[won[:, 0] & (n_winners == 1)], minlength=MAX_PLAYERS + 1)
+        self.first_ties += np.bincount(players[won[:, 0] & (n_winners > 1)], minlength=MAX_PLAYERS + 1)
+        self.first_share += np.bincount(players, won[:, 0] / n_winners, minlength=MAX_PLAYERS + 1)
+        self.ties += np.bincount(players[n_winners > 1], minlength=MAX_PLAYERS + 1)
+        self.worms += np.bincount(worms[worms >= 0], minlength=MAX_WORMS + 1)
+
+    def arrays(self):
+        """:returns a dictionary of the statistics as numpy arrays, including the rates computed from the counts"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result = {k: np.asarray(v) for k, v in vars(self).items()}
+            result['bust_rate_by_dice'] = self.roll_busts / self.rolls
+            result['bust_rate'] = np.asarray(self.busts / self.turns if self.turns else np.nan)
+            result['steal_rate'] = np.asarray(self.stolen.sum() / (self.taken.sum() + self.stolen.sum()))
+            result['first_player_win_rate'] = self.first_share / self.games
+        return result
+
+    def save(self, path):
+        """writes the statistics to a compressed numpy .npz file"""
+        np.savez_compressed(path, **self.arrays())
+
+
+def analyse(paths, games=100000):
+    """:returns a GameStats object of all games in the record files paths, read in chunks of games"""
+    stats = GameStats()
+    for events in read_chunks(paths, games):
+        stats.add(events)
+    return stats
+
+
+def main(argv=None):
+    """command line entry point, analyses game record files and writes the statistics to a .npz file"""
+    parser = argparse.ArgumentParser(description='Statistics of the games in Regenwormen game record files')
+    parser.add_argument('records', nargs='+', help='game record files, see records.py')
+    parser.add_argument('--out', default='stats.npz')
+    parser.add_argument('--chunk', type=int, default=100000, help='number of games read at a time')
+    args = parser.parse_args(argv)
+
+    stats = analyse(args.records, args.chunk)
+    stats.save(args.out)
+    arrays = stats.arrays()
+    print(f'{stats.games.sum()} games, {stats.turns} turns, {arrays["bust_rate"]:.3f} of the turns lost, '
+          f'{arrays["steal_rate"]:.3f} of the dominos stolen')
+    for n in range(1, NUM_DICE + 1):
+        print(f'{n} dice: {arrays["bust_rate_by_dice"][n]:.3f} of {stats.rolls[n]} rolls without a choice')
+    for p in range(2, MAX_PLAYERS + 1):
+        if stats.games[p]:
+            print(f'{p} players: first player wins {arrays["first_player_win_rate"][p]:.3f}, '
+                  f'{stats.ties[p] / stats.games[p]:.3f} of the games tied')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
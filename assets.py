@@ -0,0 +1,71 @@
+import pygame
+
+# image files used in the game window: the dice faces, the dominos 21 to 36 and the backside of a domino
+DIE_IMAGES = {1: 'dobbel_1.png', 2: 'dobbel_2.png', 3: 'dobbel_3.png', 4: 'dobbel_4.png', 5: 'dobbel_5.png',
+              'worm': 'dobbel_w1.png'}
+DOMINO_IMAGES = {k: f'{k}.png' for k in range(21, 37)}
+BACKSIDE_IMAGE = 'backside.png'
+
+
+class ImageAtlas:
+
+    max_width = 1024
+
+    def __init__(self, path, names=()):
+        """
+        Initializes an ImageAtlas object that decodes each image file once and packs the images in one atlas surface.
+        Requires a pygame display mode to be set, the atlas is converted to the display pixel format
+
+        :arg path: folder containing the image files
+        :arg names: file names of the images to pack in the atlas
+        """
+        self.path = path
+        self.images = {}    # image surfaces by file name, subsurfaces of self.atlas
+        self.hits = 0
+        self.misses = 0
+        self.atlas = None
+        if names:
+            self.pack(names)
+
+    def pack(self, names):
+        """
+        :arg names: file names of the images to pack
+
+        Decodes the images and copies them into the rows of a new atlas surface, the images are kept as subsurfaces
+        of the atlas that share its pixels
+        """
+        decoded = {name: pygame.image.load(self.path + name) for name in names}
+
+        # place the images in rows, from the highest to the lowest image
+        places, x, y, row_height = {}, 0, 0, 0
+        for name in sorted(decoded, key=lambda n: -decoded[n].get_height()):
+            w, h = decoded[name].get_size()
+            if x + w > ImageAtlas.max_width:
+                x, y, row_height = 0, y + row_height, 0
+            places[name] = pygame.Rect(x, y, w, h)
+            x += w
+            row_height = max(row_height, h)
+
+        self.atlas = pygame.Surface((ImageAtlas.max_width, y + row_height)).convert()
+        for name, rect in places.items():
+            self.atlas.blit(decoded[name], rect)
+        self.images = {name: self.atlas.subsurface(rect) for name, rect in places.items()}
+
+    def get(self, name):
+        """
+        :arg name: file name of an image
+
+        :returns the surface of the image, an image missing in the atlas is decoded once and kept as a separate surface
+        """
+        surf = self.images.get(name)
+        if surf is not None:
+            self.hits += 1
+            return surf
+        self.misses += 1
+        surf = pygame.image.load(self.path + name).convert()
+        self.images[name] = surf
+        return surf
+
+    def stats(self):
+        """:returns a dictionary with the number of images and the cache hits and misses"""
+        return {'images': len(self.images), 'hits': self.hits, 'misses': self.misses}
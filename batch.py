@@ -0,0 +1,174 @@
+import numpy as np
+
+from dice import MAX_DICE, OUTCOMES, CUMULATIVE, TOTALS
+from rules import POINTS, WORM, NUM_DICE, MAX_SCORE, DOMINO_VALUES, claim_table
+
+POINTS_ARRAY = np.array(POINTS, dtype=np.int16)
+
+# The roll tables of dice.py as NumPy arrays for rolling dice in bulk
+OUTCOME_ARRAYS = [np.array(o, dtype=np.int8) for o in OUTCOMES]
+CUMULATIVE_ARRAYS = [np.array(c, dtype=np.float64) / t for c, t in zip(CUMULATIVE, TOTALS)]
+
+
+def roll_many(n, rng, size=None):
+    """
+    :arg n: number of dice to roll, an integer or an array of integers with the number of dice of each roll
+    :arg rng: a numpy.random.Generator instance
+    :arg size: number of rolls when n is an integer
+
+    :returns an int8 array with a face-count vector (last axis) for every roll
+    """
+    if size is not None:
+        n = np.full(size, n)
+    n = np.asarray(n)
+    u = rng.random(n.shape)
+    result = np.zeros(n.shape + (6,), dtype=np.int8)
+    for k in range(1, MAX_DICE + 1):
+        rolls = n == k
+        if rolls.any():
+            index = np.searchsorted(CUMULATIVE_ARRAYS[k], u[rolls], side='right')
+            result[rolls] = OUTCOME_ARRAYS[k][np.minimum(index, len(OUTCOMES[k]) - 1)]
+    return result
+
+
+class TurnBatch:
+    def __init__(self, rolled, parked, score, dice_left, claim):
+        """
+        Initializes a TurnBatch object, the view on the turns still being played that is passed to a batch policy.
+        Every attribute is an array with one row per turn
+
+        :arg rolled: face-count vectors of the last roll, shape (n, 6)
+        :arg parked: boolean array of the faces parked so far, shape (n, 6)
+        :arg score: the turn scores of the parked dice
+        :arg dice_left: number of dice that are not parked
+        :arg claim: the domino obtained when stopping now, 0 when stopping is not allowed
+        """
+        self.rolled = rolled
+        self.parked = parked
+        self.score = score
+        self.dice_left = dice_left
+        self.claim = claim
+
+    @property
+    def has_worm(self):
+        """:returns a boolean array, True for the turns with at least one worm parked"""
+        return self.parked[:, WORM]
+
+    @property
+    def options(self):
+        """:returns a boolean array of shape (n, 6) with the faces of the last roll that are allowed to be chosen"""
+        return (self.rolled > 0) & ~self.parked
+
+    def __len__(self):
+        return len(self.score)
+
+
+class GreedyPolicy:
+    """Batch policy that parks the face worth the most points and stops as soon as a domino can be taken"""
+
+    def choose_face(self, batch):
+        """:returns an array with the face to park for every turn of the batch"""
+        points = np.where(batch.options, batch.rolled * POINTS_ARRAY, -1)
+        # on equal points take the highest face, like rules.GreedyBot
+        return 5 - np.argmax(points[:, ::-1], axis=1)
+
+    def should_stop(self, batch):
+        """:returns a boolean array, True to stop the turn, only used for turns where stopping is allowed"""
+        return np.ones(len(batch), dtype=bool)
+
+
+class ThresholdPolicy(GreedyPolicy):
+    """Batch policy that parks the face worth the most points and stops when the score reaches a threshold"""
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+
+    def should_stop(self, batch):
+        """:returns a boolean array, True to stop the turn, only used for turns where stopping is allowed"""
+        return batch.score >= self.threshold
+
+
+class TurnResults:
+    def __init__(self, n):
+        """
+        Initializes a TurnResults object with the outcome of n simulated turns
+
+        :arg self.domino: the domino obtained at the end of each turn, 0 when the turn is lost
+        :arg self.score: the turn score of the parked dice at the end of each turn, 0 when the turn is lost
+        :arg self.rolls: the number of rolls in each turn
+        """
+        self.domino = np.zeros(n, dtype=np.int8)
+        self.score = np.zeros(n, dtype=np.int16)
+        self.rolls = np.zeros(n, dtype=np.int8)
+
+    @property
+    def busted(self):
+        """:returns a boolean array, True for the turns that were lost"""
+        return self.domino == 0
+
+    def bust_rate(self):
+        """:returns the fraction of the turns that were lost"""
+        return float(self.busted.mean())
+
+    def score_distribution(self):
+        """:returns an array with the fraction of the turns ending with each score from 0 to MAX_SCORE"""
+        return np.bincount(self.score, minlength=MAX_SCORE + 1) / len(self.score)
+
+    def domino_distribution(self):
+        """:returns a dictionary with the fraction of the turns ending with each domino, 0 for a lost turn"""
+        counts = np.bincount(self.domino, minlength=max(DOMINO_VALUES) + 1)
+        return {d: float(counts[d]) / len(self.domino) for d in [0] + list(DOMINO_VALUES) if counts[d]}
+
+
+def simulate_turns(n, policy, tiles=DOMINO_VALUES, steals=(), rng=None):
+    """
+    :arg n: the number of independent turns to play
+    :arg policy: a batch policy object with the methods choose_face(batch) and should_stop(batch)
+    :arg tiles: the domino numbers on the table
+    :arg steals: the upper domino numbers of the other players
+    :arg rng: a numpy.random.Generator instance
+
+    Plays n turns at once as arrays with the same rules as throw_dice and stop_turn: a turn is lost when no face of
+    a roll can be chosen, and can only be stopped with a worm parked and a domino to take
+
+    :returns a TurnResults object
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    claims = np.array([d or 0 for d in claim_table(tiles, steals)], dtype=np.int8)
+    results = TurnResults(n)
+
+    active = np.arange(n)
+    parked = np.zeros((n, 6), dtype=bool)
+    score = np.zeros(n, dtype=np.int16)
+    dice_left = np.full(n, NUM_DICE, dtype=np.int8)
+
+    while len(active):
+        rolled = roll_many(dice_left, rng)
+        results.rolls[active] += 1
+
+        # a turn is lost when no face of the roll can be chosen
+        alive = ((rolled > 0) & ~parked).any(axis=1)
+        active, rolled = active[alive], rolled[alive]
+        parked, score, dice_left = parked[alive], score[alive], dice_left[alive]
+        rows = np.arange(len(active))
+
+        batch = TurnBatch(rolled, parked, score, dice_left, claims[score] * parked[:, WORM])
+        face = np.asarray(policy.choose_face(batch))
+        if not batch.options[rows, face].all():
+            raise ValueError('policy chose a face that can not be chosen')
+        count = rolled[rows, face]
+        parked[rows, face] = True
+        dice_left = dice_left - count
+        score = score + POINTS_ARRAY[face] * count
+
+        # stop the turns that can and want to stop, the turns without dice left can not go on
+        batch = TurnBatch(rolled, parked, score, dice_left, claims[score] * parked[:, WORM])
+        stop = (batch.claim > 0) & ((dice_left == 0) | np.asarray(policy.should_stop(batch)))
+        results.domino[active[stop]] = batch.claim[stop]
+        results.score[active] = score
+        go_on = ~stop & (dice_left > 0)
+        active, parked, score, dice_left = active[go_on], parked[go_on], score[go_on], dice_left[go_on]
+
+    # a lost turn scores nothing, like the domino it gets
+    results.score[results.busted] = 0
+    return results
@@ -0,0 +1,315 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+
+# render in memory, the benchmarks do not need a window
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import numpy as np
+
+import dice
+import batch
+import rules
+
+# list of (name, group, function), each function takes a number of operations and returns the seconds they took
+BENCHMARKS = []
+
+
+def benchmark(name, group):
+    """decorator that adds a function to the BENCHMARKS list"""
+    def register(func):
+        BENCHMARKS.append((name, group, func))
+        return func
+    return register
+
+
+def measure(func, repeat=5, min_time=0.05):
+    """
+    :arg func: benchmark function taking the number of operations to run
+    :arg repeat: number of rounds measured
+    :arg min_time: minimum duration of a round in seconds, the number of operations is doubled until it is reached
+
+    :returns the fastest time of one operation over the rounds, in seconds
+    """
+    n = 1
+    while func(n) < min_time:
+        n *= 2
+    return min(func(n) for _ in range(repeat)) / n
+
+
+def timed(n, setup, operation):
+    """
+    :arg setup: function called before every operation, its result is passed to the operation and is not timed
+
+    :returns the seconds n operations took
+    """
+    total = 0.0
+    for _ in range(n):
+        arg = setup()
+        start = time.perf_counter()
+        operation(arg)
+        total += time.perf_counter() - start
+    return total
+
+
+# Rules ---------------------------------------------------------------------------------------------------------------
+
+@benchmark('roll 8 dice', 'rules')
+def bench_roll(n):
+    rng = random.Random(0)
+    start = time.perf_counter()
+    for _ in range(n):
+        dice.roll(8, rng)
+    return time.perf_counter() - start
+
+
+@benchmark('roll 8 dice (DiceStream)', 'rules')
+def bench_roll_stream(n):
+    stream = dice.DiceStream(0)
+    start = time.perf_counter()
+    for i in range(n):
+        stream.roll(8, i, 0)
+    return time.perf_counter() - start
+
+
+@benchmark('roll 8 dice x 10000 (numpy)', 'rules')
+def bench_roll_many(n):
+    rng = np.random.default_rng(0)
+    start = time.perf_counter()
+    for _ in range(n):
+        batch.roll_many(8, rng, 10000)
+    return time.perf_counter() - start
+
+
+def turn_position(score, parked, table=None, stacks=None):
+    """:returns a rules.Game object of 3 players with the current player at a turn score with worms parked"""
+    game = rules.Game(3, random.Random(0))
+    if table is not None:
+        game.table = {d: rules.DOMINO_VALUES[d] for d in table}
+    if stacks is not None:
+        game.stacks = [list(s) for s in stacks]
+    game.reindex()
+    game.turn.score = score
+    game.turn.parked = list(parked)
+    game.turn.dice_left = rules.NUM_DICE - sum(parked)
+    return game
+
+
+# positions for the claims: a domino from the table, a lower domino from the table and a stolen domino
+CLAIMS = {'table': (27, None, None), 'fallback': (35, [21, 22, 23, 24, 25], None),
+          'steal': (28, [21, 22], [[], [27, 28], [23]])}
+
+
+for _claim, (_score, _table, _stacks) in CLAIMS.items():
+    def _bench_claim(n, score=_score, table=_table, stacks=_stacks):
+        return timed(n, lambda: turn_position(score, [0, 0, 1, 1, 1, 2], table, stacks), lambda g: g.stop())
+    benchmark(f'Game.stop ({_claim})', 'rules')(_bench_claim)
+
+
+@benchmark('headless game, 4 greedy bots', 'rules')
+def bench_game(n):
+    rng = random.Random(0)
+    bots = [rules.GreedyBot()] * 4
+    start = time.perf_counter()
+    for _ in range(n):
+        rules.simulate_game(bots, rng)
+    return time.perf_counter() - start
+
+
+# Game window ---------------------------------------------------------------------------------------------------------
+
+SESSION = None
+
+
+def session():
+    """:returns a GameSession of 6 players drawing in memory, created on first use"""
+    global SESSION, R
+    if SESSION is None:
+        import regenwormen as R
+        # the game loads its images from the working directory it was imported in, use the ones next to this file
+        R.PATH = os.path.dirname(os.path.abspath(__file__))
+        SESSION = R.play_game(['Speler 1', 'Speler 2', 'Speler 3', 'Speler 4', 'Speler 5', 'Speler 6'],
+                              game=False, fps=0)
+        R.screen.update()
+    return SESSION
+
+
+def new_throw():
+    """:returns a new Throw object for a new turn of the current player"""
+    s = session()
+    s.game.turn = rules.Turn()
+    return R.Throw(s.game)
+
+
+@benchmark('Throw.check_throw', 'game')
+def bench_check_throw(n):
+    throw = new_throw()
+    start = time.perf_counter()
+    for _ in range(n):
+        throw.check_throw()
+    return time.perf_counter() - start
+
+
+@benchmark('Throw.calculate_score', 'game')
+def bench_calculate_score(n):
+    return timed(n, new_throw, lambda throw: throw.calculate_score('die1'))
+
+
+@benchmark('throw_dice', 'game')
+def bench_throw_dice(n):
+    s = session()
+
+    def setup():
+        throw = new_throw()
+        throw.calculate_score('die1')
+        return throw
+
+    def operation(throw):
+        R.throw_dice(throw, s.textboard, s.players, s.dominos, s.game.current, s.player_areas, True, True)
+    total = timed(n, setup, operation)
+    s.new_game()
+    return total
+
+
+for _claim, (_score, _table, _stacks) in CLAIMS.items():
+    def _bench_stop_turn(n, score=_score, table=_table, stacks=_stacks):
+        s = session()
+
+        def setup():
+            s.new_game()
+            position = turn_position(score, [0, 0, 1, 1, 1, 2], table, stacks)
+            s.game.table.clear()
+            s.game.table.update(position.table)
+            s.game.stacks[:3] = position.stacks
+            s.game.reindex()
+            s.game.turn = position.turn
+            s.game.current = 0
+            upper = [s.players[j].get_upper_domino() for j in range(1, len(s.players))]
+            return [ud[0] for ud in upper if ud is not None], upper
+
+        def operation(options):
+            R.stop_turn(s.textboard, s.players, s.dominos, 0, s.player_areas, options[0], options[1],
+                        s.dominos.get_lowest_domino(), True, True)
+        return timed(n, setup, operation)
+    benchmark(f'stop_turn ({_claim})', 'game')(_bench_stop_turn)
+
+
+# Rendering -----------------------------------------------------------------------------------------------------------
+
+@benchmark('Scoreboard.current_player', 'render')
+def bench_current_player(n):
+    s = session()
+    start = time.perf_counter()
+    for i in range(n):
+        s.scoreboard.current_player(i % len(s.players))
+    R.screen.update()
+    return time.perf_counter() - start
+
+
+@benchmark('Textboard.message', 'render')
+def bench_message(n):
+    s = session()
+    start = time.perf_counter()
+    for i in range(n):
+        s.textboard.message(f'Speler {i % 6 + 1} krijgt domino {21 + i % 16} met waarde {i % 4 + 1}')
+    R.screen.update()
+    return time.perf_counter() - start
+
+
+@benchmark('full board redraw', 'render')
+def bench_redraw(n):
+    s = session()
+    start = time.perf_counter()
+    for i in range(n):
+        R.screen.fill(R.BG)
+        for d in s.dominos.dominoVals:
+            R.screen.blit(s.dominos.surf[d], s.dominos.rect[d])
+        for k in s.throw.get_throw.keys():
+            R.screen.blit(s.throw.get_throw[k].surf, s.throw.get_throw[k].rect)
+        s.throw_button.draw(R.screen)
+        s.stop_button.draw(R.screen)
+        s.scoreboard.current_player(i % len(s.players))
+        s.textboard.message('Speler 1 krijgt domino 27 met waarde 2')
+        R.screen.update()
+    return time.perf_counter() - start
+
+
+# Results -------------------------------------------------------------------------------------------------------------
+
+def run(groups=None, names=None, repeat=5):
+    """
+    :arg groups: list of the groups to run (rules, game, render), all groups by default
+    :arg names: list of substrings, only the benchmarks with one of them in their name are run
+
+    :returns a dictionary with the seconds per operation of each benchmark
+    """
+    results = {}
+    for name, group, func in BENCHMARKS:
+        if groups and group not in groups:
+            continue
+        if names and not any(n in name for n in names):
+            continue
+        results[name] = {'group': group, 'seconds': measure(func, repeat)}
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    :arg threshold: the fraction a benchmark may be slower than its baseline before it counts as a regression
+
+    :returns a list of (name, seconds, baseline seconds, ratio) of the benchmarks slower than allowed
+    """
+    regressions = []
+    for name, result in results.items():
+        if name in baseline:
+            ratio = result['seconds'] / baseline[name]['seconds']
+            if ratio > 1 + threshold:
+                regressions.append((name, result['seconds'], baseline[name]['seconds'], ratio))
+    return regressions
+
+
+def main(argv=None):
+    """command line entry point, prints the results and exits with status 1 when a benchmark regressed"""
+    parser = argparse.ArgumentParser(description='Benchmark the rules, game and rendering of Regenwormen')
+    parser.add_argument('names', nargs='*', help='only run the benchmarks with one of these words in their name')
+    parser.add_argument('--group', action='append', choices=['rules', 'game', 'render'])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--out', help='write the results as JSON to this file')
+    parser.add_argument('--baseline', default='benchmark_baseline.json', help='results to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.10, help='allowed slowdown, 0.10 is 10%%')
+    args = parser.parse_args(argv)
+
+    results = run(args.group, args.names, args.repeat)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+
+    for name, result in results.items():
+        seconds = result['seconds']
+        line = f'{name:>40}: {seconds * 1e6:12.2f} us {1 / seconds:14.0f} ops/s'
+        if name in baseline:
+            line += f' {seconds / baseline[name]["seconds"]:8.2f}x baseline'
+        print(line)
+
+    output = {'python': platform.python_version(), 'platform': platform.platform(), 'results': results}
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(output, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(output, f, indent=2)
+
+    regressions = compare(results, baseline, args.threshold)
+    for name, seconds, base, ratio in regressions:
+        print(f'REGRESSION {name}: {seconds * 1e6:.2f} us, baseline {base * 1e6:.2f} us ({ratio:.2f}x)')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,283 @@
+import sys
+import json
+import socket
+import argparse
+import threading
+
+import pygame
+from pygame.locals import *
+
+import regenwormen as gui
+from rules import Game, FACES, DOMINO_VALUES, expand
+from assets import DIE_IMAGES
+from server import apply_event
+
+# event posted by the reader thread for every message of the server, with message None when the connection is closed
+SERVER = USEREVENT + 1
+
+# area of the dice in the game window, the dice of the last roll are drawn in the upper row and the parked dice in the
+# lower row, at the places of the dice of regenwormen.Throw
+DICE_AREA = (425, 300, 800, 210)
+DICE_X = 475
+DICE_ROWS = (350, 460)
+
+
+class TableView:
+    def __init__(self, host, port, table, players=2, name=None, fps=gui.FPS):
+        """
+        Initializes a TableView object, a thin game window for one seat at a table of a server.Server. The rules run
+        on the server: the view only sends the selections, rolls and stops of its player, and applies the events of
+        the update messages to a copy of the game with server.apply_event. Only the parts of the window whose state
+        changed are drawn again. The messages of the server are read by a background thread that wakes up the game
+        loop, so the window never waits for the network
+
+        :arg host, port: address of the server
+        :arg table: name of the table, it is created when it does not exist
+        :arg players: number of seats of a new table
+        :arg name: name of the player, the server names the player after the seat when None
+        :arg fps: the maximum number of frames per second drawn in the game window
+        """
+        self.table = table
+        self.players = players
+        self.name = name
+        self.running = True
+        self.connected = True
+        self.seat = None
+        self.game = None
+        self.last_roll = None   # face-count vector of the dice of the last roll that are not parked
+        self.dice = []          # (rect, face) of the dice drawn in the upper row
+        self.new_game_button = None
+        gui.init_display(fps)
+        gui.screen.blit(gui.message_area, (0, gui.SCREEN_HEIGHT - 70))
+        self.textboard = gui.Textboard()
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed([QUIT, KEYDOWN, MOUSEBUTTONDOWN, VIDEOEXPOSE, SERVER])
+
+        self.socket = socket.create_connection((host, port))
+        threading.Thread(target=self.read_loop, daemon=True).start()
+        self.join()
+
+    def read_loop(self):
+        """reads the messages of the server in the background thread and posts them as SERVER events"""
+        try:
+            with self.socket.makefile('r', encoding='utf-8') as f:
+                for line in f:
+                    pygame.event.post(pygame.event.Event(SERVER, message=json.loads(line)))
+            pygame.event.post(pygame.event.Event(SERVER, message=None))
+        except (OSError, pygame.error):
+            pass  # the window closed the connection, or has been closed
+
+    def send(self, message):
+        """sends a message to the server"""
+        message['table'] = self.table
+        try:
+            self.socket.sendall((json.dumps(message) + '\n').encode())
+        except OSError:
+            self.disconnected()
+
+    def join(self):
+        """asks the server for a seat at the table"""
+        self.send({'type': 'join', 'players': self.players, 'name': self.name})
+        self.textboard.message('Wachten op de andere spelers aan tafel ' + self.table)
+
+    def disconnected(self):
+        self.connected = False
+        self.textboard.message('De verbinding met de server is verbroken')
+
+    def new_game(self, names):
+        """
+        :arg names: list of the names of the players at the table
+
+        Draws the board of a new game, with the dominos on the table, the scoreboard and the buttons
+        """
+        gui.screen.fill(gui.BG)
+        gui.screen.blit(gui.message_area, (0, gui.SCREEN_HEIGHT - 70))
+        self.textboard = gui.Textboard()
+        self.game = Game(len(names))
+        self.dominos = gui.Dominos(self.game)
+        self.players = [gui.Player(names[i], self.dominos, self.textboard, i) for i in range(len(names))]
+        self.scoreboard = gui.Scoreboard(self.players)
+        self.player_areas = self.scoreboard.get_coords()
+        self.throw_button = gui.Button(gui.LBLUE, 100, 400, 200, 70, 'Dobbelen')
+        self.throw_button.draw(gui.screen, outline=True)
+        self.stop_button = gui.Button(gui.LBLUE, 1400, 400, 200, 70, 'Stop')
+        self.stop_button.draw(gui.screen, outline=True)
+        self.new_game_button = None
+        self.last_roll = None
+
+        # what is drawn of the dominos on the table, the upper dominos of the players and the dice
+        self.drawn_table = {d: 'table' for d in DOMINO_VALUES}
+        self.drawn_tops = [None] * len(names)
+        self.drawn_dice = None
+
+    def receive(self, message):
+        """:arg message: a message of the server, None when the connection is closed"""
+        if message is None:
+            self.disconnected()
+        elif message['type'] == 'joined':
+            self.seat = message['seat']
+        elif message['type'] == 'start':
+            self.new_game(message['names'])
+            self.draw()
+        elif message['type'] == 'error':
+            self.textboard.message(message['message'])
+        elif message['type'] == 'update' and self.game is not None:
+            for event in message['events']:
+                self.apply(event)
+            if not self.game.game_over:
+                self.draw()
+
+    def apply(self, event):
+        """applies an event of the server to the copy of the game and shows what happened on the textboard"""
+        kind = event['kind']
+        if kind == 'end':
+            self.new_game_button = self.scoreboard.end_of_game()
+            return
+        if not apply_event(self.game, event):
+            self.textboard.message('Het spel verschilt van het spel op de server')
+        name = self.players[event['player']].name if 'player' in event else None
+        if kind == 'roll':
+            self.last_roll = tuple(event['rolled'])
+        elif kind == 'select':
+            self.last_roll = tuple(0 if f == event['face'] else c for f, c in enumerate(self.last_roll))
+        elif kind == 'take':
+            self.last_roll = None
+            domino, victim = event['domino'], event['victim']
+            if victim is None:
+                self.textboard.message(f'{name} krijgt domino {domino} met waarde {DOMINO_VALUES[domino]}')
+            else:
+                self.textboard.message(f'{name} heeft domino {domino} van {self.players[victim].name} afgepakt')
+        elif kind == 'bust':
+            self.last_roll = None
+            text = f'{name} verliest de beurt'
+            if event['returned'] is not None:
+                text += f' en legt domino {event["returned"]} terug'
+            self.textboard.message(text)
+        elif kind == 'left':
+            self.textboard.message(f'{name} heeft de tafel verlaten, de computer speelt verder')
+
+    def draw(self):
+        """draws the parts of the game window that changed since they were drawn"""
+        game = self.game
+        for d in DOMINO_VALUES:
+            state = 'table' if d in game.table else 'flipped' if d in game.flipped else None
+            if state != self.drawn_table[d]:
+                if state == 'table':
+                    self.dominos.return_domino(d)
+                elif state == 'flipped':
+                    self.dominos.delete_domino(d)
+                else:
+                    gui.screen.fill(gui.BG, (self.dominos.rect[d].topleft, (100, 200)))
+                self.drawn_table[d] = state
+        for i, player in enumerate(self.players):
+            if game.top(i) != self.drawn_tops[i]:
+                player.show_upper_domino(self.player_areas[i])
+                self.drawn_tops[i] = game.top(i)
+        self.scoreboard.current_player(game.current)
+        dice = (tuple(game.turn.parked), self.last_roll)
+        if dice != self.drawn_dice:
+            self.draw_dice()
+            self.drawn_dice = dice
+
+    def draw_dice(self):
+        """draws the parked dice in the lower row and the dice of the last roll that are not parked in the upper row"""
+        gui.screen.fill(gui.BG, DICE_AREA)
+        parked = expand(self.game.turn.parked)
+        loose = expand(self.last_roll) if self.last_roll is not None else []
+        self.dice = []
+        for k, face in enumerate(parked + loose):
+            surf = gui.IMAGES.get(DIE_IMAGES[FACES[face]])
+            rect = surf.get_rect(center=(DICE_X + 100 * k, DICE_ROWS[k < len(parked)]))
+            gui.screen.blit(surf, rect)
+            if k >= len(parked):
+                self.dice.append((rect, face))
+
+    def my_turn(self):
+        """:returns True when the player of the view has to move"""
+        return self.connected and self.game is not None and not self.game.game_over and self.game.current == self.seat
+
+    def select(self, pos):
+        """
+        :arg pos: tuple with the x,y coordinates of a mouse click
+
+        Sends the selection of the face of the clicked die, if it can be chosen
+        """
+        for rect, face in self.dice:
+            if rect.collidepoint(pos):
+                if face in self.game.turn.options():
+                    self.send({'type': 'select', 'face': face})
+                else:
+                    self.textboard.message('Deze waarde heb je al gekozen')
+                return
+
+    def handle(self, event):
+        """:arg event: a pygame event"""
+        if event.type == QUIT or (event.type == KEYDOWN and event.key == K_ESCAPE):
+            self.running = False
+
+        elif event.type == VIDEOEXPOSE:
+            gui.screen.mark(gui.screen.get_rect())
+
+        elif event.type == SERVER:
+            self.receive(event.message)
+
+        elif self.new_game_button is not None:
+            # join the table again for a new game when the new game button is clicked
+            if event.type == MOUSEBUTTONDOWN and self.new_game_button.isOver(event.pos) and self.connected:
+                self.new_game_button = None
+                gui.screen.fill(gui.BG)
+                gui.screen.blit(gui.message_area, (0, gui.SCREEN_HEIGHT - 70))
+                self.textboard = gui.Textboard()
+                self.join()
+
+        elif not self.my_turn():
+            # the mouse and keyboard are ignored during the turns of the other players
+            pass
+
+        elif event.type == KEYDOWN:
+            # space for new throw or 's' to stop turn, the server refuses them when they are not allowed
+            if event.key == K_SPACE:
+                self.send({'type': 'roll'})
+            elif event.key == K_s:
+                self.send({'type': 'stop'})
+
+        elif event.type == MOUSEBUTTONDOWN:
+            if self.throw_button.isOver(event.pos):
+                self.send({'type': 'roll'})
+            elif self.stop_button.isOver(event.pos):
+                self.send({'type': 'stop'})
+            elif self.game.turn.rolled is not None:
+                self.select(event.pos)
+
+    def run(self):
+        """the game loop, sleeps until an event or a message of the server arrives and draws the changes"""
+        while self.running:
+            events = [pygame.event.wait(gui.EVENT_TIMEOUT)] + pygame.event.get()
+            for event in events:
+                if event.type != NOEVENT:
+                    self.handle(event)
+                if not self.running:
+                    break
+            else:
+                gui.screen.update()
+        self.socket.close()
+        pygame.quit()
+
+
+def main(argv=None):
+    """command line entry point, opens the game window of a seat at a table of a server"""
+    parser = argparse.ArgumentParser(description='Play Regenwormen at a table of a server.py server')
+    parser.add_argument('table', help='name of the table, it is created when it does not exist')
+    parser.add_argument('--name', default=None, help='name of the player')
+    parser.add_argument('--players', type=int, default=2, help='number of seats of a new table')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--fps', type=int, default=gui.FPS, help='maximum number of frames per second')
+    args = parser.parse_args(argv)
+
+    TableView(args.host, args.port, args.table, args.players, args.name, args.fps).run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,137 @@
+import threading
+
+from multiprocessing import Pool
+
+from rules import POINTS, WORM, NUM_DICE, claim_table
+from solver import TurnSolver, parked_mask
+
+# solver of the worker process, its value tables are kept between the hints of consecutive turns
+SOLVER = None
+
+
+def bust_chance(parked, dice_left):
+    """:returns the probability that rolling the dice left gives no face that can be chosen"""
+    if dice_left == 0:
+        return 1.0
+    return (sum(1 for c in parked if c) / 6) ** dice_left
+
+
+def hints(tiles, steals, own_top, parked, score, rolled):
+    """
+    Computes the hints of a turn, in the worker process
+
+    :arg tiles: the domino numbers on the table
+    :arg steals: the upper domino numbers of the other players
+    :arg own_top: the upper domino number of the current player or None
+    :arg parked: number of parked dice per face
+    :arg score: the turn score of the parked dice
+    :arg rolled: face-count vector of the last roll, None when the player has to choose between rolling and stopping
+
+    :returns a dictionary with
+        'faces': for every face that can be chosen a tuple (face, expected worms, bust chance of the next roll, domino
+            when stopping after choosing it or None), only after a roll
+        'bust': bust chance when rolling the dice left, 'roll': expected worms of rolling again, 'stop': domino when
+            stopping now or None, only when the dice have to be rolled again
+    """
+    global SOLVER
+    if SOLVER is None:
+        SOLVER = TurnSolver()
+    values = SOLVER.values(tiles, steals, own_top)
+    claims = claim_table(tiles, steals)
+    mask = parked_mask(parked)
+    if rolled is not None:
+        dice_left = sum(rolled)
+        faces = []
+        for f in range(6):
+            c = rolled[f]
+            if c and not parked[f]:
+                after = list(parked)
+                after[f] = c
+                new_score = score + POINTS[f] * c
+                stop = claims[new_score] if after[WORM] else None
+                faces.append((f, values.value(mask | 1 << f, new_score, dice_left - c),
+                              bust_chance(after, dice_left - c), stop))
+        return {'faces': faces}
+    dice_left = NUM_DICE - sum(parked)
+    return {'bust': bust_chance(parked, dice_left), 'roll': values.roll_value(mask, score, dice_left),
+            'stop': claims[score] if parked[WORM] else None}
+
+
+def game_hints_args(game):
+    """:returns the arguments of hints for the current player of a rules.Game object"""
+    steals = [game.top(j) for j in range(len(game.stacks)) if j != game.current]
+    turn = game.turn
+    return (tuple(sorted(game.table)), tuple(s for s in steals if s is not None), game.top(game.current),
+            tuple(turn.parked), turn.score, None if turn.rolled is None else tuple(turn.rolled))
+
+
+class Coach:
+    def __init__(self, notify=None):
+        """
+        Initializes a Coach object that computes the hints of a turn in a worker process, so the game loop never waits
+        for them. Only one computation runs at a time: a request made while the worker is busy replaces the request
+        waiting before it, and the results of a state that is no longer current are thrown away
+
+        :arg notify: function called without arguments from a background thread when new hints are ready
+        """
+        self.notify = notify
+        self.pool = Pool(1)
+        self.lock = threading.Lock()
+        self.key = None         # arguments of the hints of the current state, None when no hints are wanted
+        self.busy = False
+        self.waiting = None
+        self.result = None
+
+    def request(self, game):
+        """
+        Asks the hints of the current state of a rules.Game object, nothing is done when they were asked already
+
+        :returns True when the state changed since the last request
+        """
+        key = game_hints_args(game)
+        with self.lock:
+            if key == self.key:
+                return False
+            self.key = key
+            self.result = None
+            if self.busy:
+                self.waiting = key
+            else:
+                self.submit(key)
+        return True
+
+    def cancel(self):
+        """forgets the hints asked, a computation that is running finishes in the background and is thrown away"""
+        with self.lock:
+            self.key = None
+            self.waiting = None
+            self.result = None
+
+    def submit(self, key):
+        """starts the computation of the hints of key in the worker, called with the lock held"""
+        self.busy = True
+        self.pool.apply_async(hints, key, callback=lambda result: self.done(key, result),
+                              error_callback=lambda error: self.done(key, None))
+
+    def done(self, key, result):
+        """receives the result of a computation in the result thread of the pool and starts the request waiting"""
+        with self.lock:
+            self.busy = False
+            ready = result is not None and key == self.key
+            if ready:
+                self.result = result
+            waiting, self.waiting = self.waiting, None
+            if waiting is not None and waiting == self.key:
+                self.submit(waiting)
+        if ready and self.notify is not None:
+            self.notify()
+
+    def poll(self):
+        """:returns the hints of the current state when they have arrived since the last poll, otherwise None"""
+        with self.lock:
+            result, self.result = self.result, None
+        return result
+
+    def close(self):
+        """stops the worker process"""
+        self.pool.terminate()
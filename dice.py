@@ -0,0 +1,121 @@
+import struct
+import hashlib
+
+from math import factorial
+from bisect import bisect_right
+from functools import lru_cache
+
+MAX_DICE = 8
+
+# constants of the SplitMix64 generator, the dice of a DiceStream are the SplitMix64 outputs of their counters
+MASK64 = (1 << 64) - 1
+GAMMA = 0x9E3779B97F4A7C15
+MAX_ROLLS = 1 << 16      # roll index range of a turn in the counter of a DiceStream
+
+
+def compositions(n, k):
+    """:returns a list of all tuples of k non-negative integers that sum up to n, in lexicographic order"""
+    if k == 1:
+        return [(n,)]
+    result = []
+    for c in range(n + 1):
+        for rest in compositions(n - c, k - 1):
+            result.append((c,) + rest)
+    return result
+
+
+def weight(counts):
+    """:returns the number of ordered rolls of the dice that give the face-count vector counts"""
+    w = factorial(sum(counts))
+    for c in counts:
+        w //= factorial(c)
+    return w
+
+
+# Face-count vectors of all outcomes of rolling n dice, with the cumulative number of ordered rolls for sampling
+OUTCOMES, CUMULATIVE, TOTALS = [], [], []
+for _n in range(MAX_DICE + 1):
+    OUTCOMES.append(tuple(compositions(_n, 6)))
+    _cumulative, _total = [], 0
+    for _counts in OUTCOMES[_n]:
+        _total += weight(_counts)
+        _cumulative.append(_total)
+    CUMULATIVE.append(_cumulative)
+    TOTALS.append(_total)
+
+
+def roll(n, rng):
+    """
+    :arg n: number of dice to roll
+    :arg rng: a random.Random instance
+
+    :returns a tuple of 6 integers with the number of dice showing each face
+    """
+    return OUTCOMES[n][bisect_right(CUMULATIVE[n], int(rng.random() * TOTALS[n]))]
+
+
+def game_seed(seed, game):
+    """:returns the seed of the random generator of game number game in a tournament with seed seed"""
+    digest = hashlib.blake2b(struct.pack('<qq', seed, game), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def mix64(x):
+    """:returns the SplitMix64 finalizer of a 64 bit integer, a mix of its bits that looks random"""
+    x = (x ^ (x >> 30)) * 0xBF58476D1CE4E5B9 & MASK64
+    x = (x ^ (x >> 27)) * 0x94D049BB133111EB & MASK64
+    return x ^ (x >> 31)
+
+
+class DiceStream:
+    def __init__(self, seed):
+        """
+        Initializes a DiceStream object, a counter-based random generator of the dice of one game: the roll with
+        index r of turn t is computed from (seed, t, r) alone. Any roll of any game can be computed again without the
+        rolls before it, and games with different seeds share no state, whatever process or order they are played in
+
+        :arg seed: integer seed of the game, for example game_seed(tournament seed, game number)
+        """
+        self.seed = seed
+        self.key = mix64(seed & MASK64)
+
+    def random(self, turn, index):
+        """:returns the float in [0, 1) of roll index of turn"""
+        x = mix64((self.key + (turn * MAX_ROLLS + index + 1) * GAMMA) & MASK64)
+        return (x >> 11) * 2.0 ** -53
+
+    def roll(self, n, turn, index):
+        """
+        :arg n: number of dice to roll
+        :arg turn: number of the turn in the game, from 0
+        :arg index: number of the roll in the turn, from 0
+
+        :returns a tuple of 6 integers with the number of dice showing each face, like roll
+        """
+        return OUTCOMES[n][bisect_right(CUMULATIVE[n], int(self.random(turn, index) * TOTALS[n]))]
+
+
+@lru_cache(maxsize=None)
+def distribution(n):
+    """:returns a tuple of (probability, counts) pairs of all face-count vectors when rolling n dice"""
+    return tuple((weight(counts) / TOTALS[n], counts) for counts in OUTCOMES[n])
+
+
+@lru_cache(maxsize=None)
+def marginal(n, k):
+    """
+    :arg n: number of dice rolled
+    :arg k: number of faces that can still be chosen
+
+    :returns a tuple of (probability, counts) pairs, where counts holds the number of dice showing each of the k faces.
+        The dice showing any of the other 6 - k faces are summed in the probability
+    """
+    other = (6 - k) / 6
+    result = []
+    for counts in compositions(n, k + 1):
+        left = counts[k]
+        if left and not other:
+            continue
+        p = weight(counts) * other ** left / 6 ** (n - left)
+        result.append((p, counts[:k]))
+    return tuple(result)
@@ -0,0 +1,190 @@
+import sys
+import time
+import argparse
+
+import numpy as np
+
+from dice import DiceStream, game_seed
+from rules import Game, GreedyBot
+from pipebot import next_decision, play_decision, FACE, STOP as STOP_DECISION
+from tournament import MIN_PLAYERS, MAX_PLAYERS
+
+# actions: 0 to 5 park the face with that index, STOP takes the domino of the turn score, ROLL rolls the dice left
+STOP = 6
+ROLL = 7
+NUM_ACTIONS = 8
+
+# columns of an observation, the tops and worms of the other players follow in their order of play after the agent
+ROLLED = slice(0, 6)        # face-count vector of the last roll, zeros when the agent chooses between stop and roll
+PARKED = slice(6, 12)       # number of dice parked per face
+SCORE = 12                  # turn score
+DICE_LEFT = 13              # dice that are not parked
+TABLE = slice(14, 30)       # 1 for each domino 21 to 36 on the table
+OWN_TOP = 30                # upper domino of the agent, 0 for none
+TOPS = 31                   # upper domino of each other player, then the worms of the agent and of each other player
+
+
+def observation_size(players):
+    """:returns the length of an observation in a game of players players"""
+    return TOPS + 2 * players - 1
+
+
+class VectorEnv:
+    def __init__(self, num_envs, players=2, opponent=None, seed=0):
+        """
+        Initializes a VectorEnv object, a reinforcement learning environment of num_envs games played at the same time.
+        The agent plays one seat of every game, the seat moves every game so the agent plays every position, the
+        other seats are played by the opponent bot. The agent only gets the decisions of its turns: which face to park
+        after a roll, and whether to stop or roll when a domino can be taken and dice are left, the other moves are
+        played for it. A finished game is replaced by a new one right away.
+
+        The observations, rewards, done flags and action masks are arrays with a row per game that are allocated once
+        and filled in place by reset and step, copy them to keep them
+
+        :arg num_envs: number of games
+        :arg players: number of players of every game
+        :arg opponent: bot object with the methods choose_face(game, options) and should_stop(game) that plays the
+            other seats, a rules.GreedyBot by default
+        :arg seed: integer seed, game g of environment i has the dice of game g * num_envs + i of a tournament
+        """
+        if not MIN_PLAYERS <= players <= MAX_PLAYERS:
+            raise ValueError(f'a game has {MIN_PLAYERS} to {MAX_PLAYERS} players, not {players}')
+        self.num_envs = num_envs
+        self.players = players
+        self.opponent = opponent if opponent is not None else GreedyBot()
+        self.seed = seed
+        self.observations = np.zeros((num_envs, observation_size(players)), np.float32)
+        self.rewards = np.zeros(num_envs, np.float32)
+        self.dones = np.zeros(num_envs, bool)
+        self.masks = np.zeros((num_envs, NUM_ACTIONS), bool)
+        self.games = [None] * num_envs
+        self.seats = [0] * num_envs
+        self.decides = [None] * num_envs
+        self.margins = [0.0] * num_envs
+        self.episodes = [0] * num_envs
+        self.steps = 0
+        self.invalid = 0
+        self.finished = 0
+
+    def reset(self):
+        """starts a new game in every environment, :returns the arrays of the observations and action masks"""
+        for i in range(self.num_envs):
+            self.new_game(i)
+        self.rewards[:] = 0
+        self.dones[:] = False
+        return self.observations, self.masks
+
+    def new_game(self, i):
+        """starts the next game of environment i and plays until the first decision of the agent"""
+        number = self.episodes[i] * self.num_envs + i
+        self.episodes[i] += 1
+        self.games[i] = Game(self.players, DiceStream(game_seed(self.seed, number)))
+        self.seats[i] = number % self.players
+        self.margins[i] = 0.0
+        self.advance(i)
+        self.observe(i)
+
+    def advance(self, i):
+        """plays the moves of the other players until the agent has to decide or the game is over"""
+        game, seat, opponent = self.games[i], self.seats[i], self.opponent
+        while True:
+            decide = next_decision(game)
+            if decide is None or game.current == seat:
+                self.decides[i] = decide
+                return
+            if decide == FACE:
+                play_decision(game, decide, opponent.choose_face(game, game.turn.options()))
+            else:
+                play_decision(game, decide, 'stop' if opponent.should_stop(game) else 'roll')
+
+    def margin(self, i):
+        """:returns the worms of the agent minus the mean worms of the other players in environment i"""
+        game, seat = self.games[i], self.seats[i]
+        total = sum(game.worms(p) for p in range(self.players))
+        own = game.worms(seat)
+        return own - (total - own) / (self.players - 1)
+
+    def observe(self, i):
+        """writes the observation and action mask of the decision of environment i"""
+        game, seat, players = self.games[i], self.seats[i], self.players
+        turn = game.turn
+        obs, mask = self.observations[i], self.masks[i]
+        obs[ROLLED] = turn.rolled if turn.rolled is not None else 0
+        obs[PARKED] = turn.parked
+        obs[SCORE] = turn.score
+        obs[DICE_LEFT] = turn.dice_left
+        obs[TABLE] = 0
+        for d in game.table:
+            obs[TABLE.start + d - 21] = 1
+        obs[OWN_TOP] = game.top(seat) or 0
+        for k in range(1, players):
+            other = (seat + k) % players
+            obs[TOPS + k - 1] = game.top(other) or 0
+            obs[TOPS + players + k - 1] = game.worms(other)
+        obs[TOPS + players - 1] = game.worms(seat)
+        mask[:] = False
+        if self.decides[i] == FACE:
+            for f in turn.options():
+                mask[f] = True
+        else:
+            mask[STOP] = mask[ROLL] = True
+
+    def step(self, actions):
+        """
+        :arg actions: an action for every environment, a face index, STOP or ROLL. An action that is not allowed by
+            the action mask is replaced by the first action allowed and counted in self.invalid
+
+        Plays the action of the agent in every game and the moves of the other players until the next decision of the
+        agent. The reward is the change of the worms of the agent minus the mean worms of the other players, so the
+        rewards of a game add up to its final margin. A finished game gets done True and the observation of the
+        first decision of the next game
+
+        :returns the arrays of the observations, rewards, done flags and action masks
+        """
+        for i in range(self.num_envs):
+            game, mask = self.games[i], self.masks[i]
+            action = int(actions[i])
+            if not (0 <= action < NUM_ACTIONS and mask[action]):
+                self.invalid += 1
+                action = int(np.argmax(mask))
+            if action < STOP:
+                play_decision(game, FACE, action)
+            else:
+                play_decision(game, STOP_DECISION, 'stop' if action == STOP else 'roll')
+            self.advance(i)
+            margin = self.margin(i)
+            self.rewards[i] = margin - self.margins[i]
+            self.margins[i] = margin
+            self.dones[i] = game.game_over
+            if game.game_over:
+                self.finished += 1
+                self.new_game(i)
+            else:
+                self.observe(i)
+        self.steps += self.num_envs
+        return self.observations, self.rewards, self.dones, self.masks
+
+
+def main(argv=None):
+    """command line entry point, measures the speed of the environment with random actions"""
+    parser = argparse.ArgumentParser(description='Speed of the vectorized Regenwormen environment')
+    parser.add_argument('--envs', type=int, default=256)
+    parser.add_argument('--players', type=int, default=2)
+    parser.add_argument('--steps', type=int, default=200, help='number of batched steps')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    env = VectorEnv(args.envs, args.players, seed=args.seed)
+    rng = np.random.default_rng(args.seed)
+    obs, masks = env.reset()
+    start = time.perf_counter()
+    for _ in range(args.steps):
+        # a random action allowed by the mask of every game
+        actions = np.argmax(rng.random(masks.shape) * masks, axis=1)
+        obs, rewards, dones, masks = env.step(actions)
+    seconds = time.perf_counter() - start
+    print(f'{env.steps / seconds:.0f} decisions/s, {env.finished / seconds:.1f} games/s, {env.invalid} invalid')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
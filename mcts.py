@@ -0,0 +1,235 @@
+import os
+import math
+import time
+import random
+
+from multiprocessing import Pool
+
+from rules import NUM_DICE, GreedyBot, play_turn
+from state import HashedGame, encode, decode
+
+# actions at the decision between rolling the dice left and stopping, the other actions are the faces to park
+ROLL, STOP = 'roll', 'stop'
+
+# Zobrist keys of the face-count vector of a roll, added to the position hash for the nodes where a face is chosen
+_rng = random.Random(0x4D435453)
+ROLLED_KEYS = [[_rng.getrandbits(64) for _ in range(NUM_DICE + 1)] for _ in range(6)]
+
+
+def rolled_key(rolled):
+    """:returns the XOR of the keys of a face-count vector"""
+    h = 0
+    for f in range(6):
+        h ^= ROLLED_KEYS[f][rolled[f]]
+    return h
+
+
+class Node:
+    __slots__ = ('actions', 'visits', 'counts', 'rewards')
+
+    def __init__(self, actions):
+        """
+        Initializes a Node object of the search tree with the statistics of the actions of one decision
+
+        :arg actions: list of the actions that can be taken
+        """
+        self.actions = actions
+        self.visits = 0
+        self.counts = [0] * len(actions)
+        self.rewards = [0.0] * len(actions)
+
+    def select(self, exploration):
+        """:returns the index of the action to try, an untried action first and otherwise the highest UCB value"""
+        log_visits = math.log(self.visits) if self.visits else 0.0
+        best, best_value = 0, -math.inf
+        for i in range(len(self.actions)):
+            n = self.counts[i]
+            if n == 0:
+                return i
+            value = self.rewards[i] / n + exploration * math.sqrt(log_visits / n)
+            if value > best_value:
+                best, best_value = i, value
+        return best
+
+
+def finish_turn(game, bot):
+    """plays the rest of the turn of the current player with a bot, from any point in the turn"""
+    n = len(game.history)
+    turn = game.turn
+    if turn.rolled is not None:
+        game.select_face(bot.choose_face(game, turn.options()))
+    while len(game.history) == n:
+        turn = game.turn
+        if game.claim() is not None and (turn.dice_left == 0 or bot.should_stop(game)):
+            game.stop()
+        elif turn.dice_left == 0:
+            game.bust()
+        else:
+            game.roll()
+            options = turn.options()
+            if not options:
+                game.bust()
+            else:
+                game.select_face(bot.choose_face(game, options))
+
+
+def evaluate(game, player):
+    """:returns the worms of player minus the most worms of the other players"""
+    worms = [game.worms(p) for p in range(len(game.stacks))]
+    mine = worms.pop(player)
+    return mine - max(worms) if worms else mine
+
+
+def search(code, rolled, budget, seed, exploration=2.0, horizon=None, rollout_bot=None):
+    """
+    :arg code: the position to search from, from state.encode
+    :arg rolled: face-count vector of the last roll when a face has to be chosen, None when the decision is to stop
+        or to roll
+    :arg budget: search time in seconds
+    :arg seed: seed of the random generator of the dice
+    :arg exploration: exploration constant of the UCB formula, in worms
+    :arg horizon: number of turns of the other players played after the turn, by default until the next turn
+    :arg rollout_bot: bot that plays the turns after the search tree, a rules.GreedyBot by default
+
+    Runs a Monte Carlo tree search over the decisions of the current turn. Tree nodes are keyed by the Zobrist hash of
+    the position (and of the roll), every rollout plays the rest of the turn and the turns of the other players with
+    the rules of rules.Game, including stealing and turning over dominos
+
+    :returns a tuple (actions, counts, rewards, iterations) with the statistics of the root actions
+    """
+    rng = random.Random(seed)
+    rollout_bot = rollout_bot if rollout_bot is not None else GreedyBot()
+    tree = {}
+    iterations = 0
+    deadline = time.perf_counter() + budget
+
+    root = decode(code, HashedGame, rng)
+    player = root.current
+    horizon = len(root.stacks) - 1 if horizon is None else horizon
+    start = len(root.history)
+
+    while True:
+        game = decode(code, HashedGame, rng)
+        game.turn.rolled = rolled
+        path = []
+
+        # selection and expansion within the current turn
+        while len(game.history) == start:
+            turn = game.turn
+            key = game.hash ^ rolled_key(turn.rolled) if turn.rolled is not None else game.hash
+            node = tree.get(key)
+            expanded = node is None
+            if expanded:
+                if turn.rolled is not None:
+                    actions = turn.options()
+                else:
+                    actions = ([ROLL] if turn.dice_left else []) + ([STOP] if game.claim() is not None else [])
+                node = tree[key] = Node(actions)
+            if not node.actions:
+                game.bust()
+                break
+            i = node.select(exploration)
+            path.append((node, i))
+            action = node.actions[i]
+            if action == ROLL:
+                game.roll()
+                if not game.turn.options():
+                    game.bust()
+            elif action == STOP:
+                game.stop()
+            else:
+                game.select_face(action)
+            if expanded:
+                break
+
+        # rollout of the rest of the turn and the turns of the other players
+        if len(game.history) == start:
+            finish_turn(game, rollout_bot)
+        for _ in range(horizon):
+            if game.game_over:
+                break
+            play_turn(game, rollout_bot)
+
+        reward = evaluate(game, player)
+        for node, i in path:
+            node.visits += 1
+            node.counts[i] += 1
+            node.rewards[i] += reward
+
+        iterations += 1
+        if time.perf_counter() > deadline:
+            break
+
+    key = root.hash ^ rolled_key(rolled) if rolled is not None else root.hash
+    node = tree[key]
+    return node.actions, node.counts, node.rewards, iterations
+
+
+def _search(args):
+    """pool worker function, see search"""
+    return search(*args)
+
+
+class MCTSBot:
+    def __init__(self, budget_ms=150, workers=None, exploration=2.0, horizon=None, rollout_bot=None, seed=None):
+        """
+        Initializes a MCTSBot object that decides with a Monte Carlo tree search within a time budget per decision.
+        The search runs on a pool of worker processes, each worker searches its own tree and the statistics of the
+        root actions of all workers are added up (root parallelization)
+
+        :arg budget_ms: search time in milliseconds per decision
+        :arg workers: number of worker processes, by default one per cpu core, 1 searches in this process
+        :arg exploration: exploration constant of the UCB formula, in worms
+        :arg horizon: number of turns of the other players in every rollout, by default until the next turn
+        :arg rollout_bot: bot that plays the rollouts, a rules.GreedyBot by default
+        :arg seed: seed of the random generator of the searches
+        """
+        self.budget = budget_ms / 1000
+        self.workers = workers or os.cpu_count()
+        self.exploration = exploration
+        self.horizon = horizon
+        self.rollout_bot = rollout_bot
+        self.rng = random.Random(seed)
+        self.pool = None
+        self.rollouts = 0
+        self.search_time = 0.0
+
+    def search(self, game):
+        """:returns the action with the most visits in the current position of a rules.Game object"""
+        start = time.perf_counter()
+        args = [(encode(game), game.turn.rolled, self.budget, self.rng.getrandbits(64), self.exploration,
+                 self.horizon, self.rollout_bot) for _ in range(self.workers)]
+        if self.workers == 1:
+            results = [search(*args[0])]
+        else:
+            if self.pool is None:
+                self.pool = Pool(self.workers)
+            results = self.pool.map(_search, args)
+
+        actions = results[0][0]
+        counts = [sum(r[1][i] for r in results) for i in range(len(actions))]
+        self.rollouts += sum(r[3] for r in results)
+        self.search_time += time.perf_counter() - start
+        return actions[counts.index(max(counts))]
+
+    def choose_face(self, game, options):
+        """:returns the face to park from the list of options"""
+        if len(options) == 1:
+            return options[0]
+        return self.search(game)
+
+    def should_stop(self, game):
+        """:returns True to stop the turn, only called when stopping is allowed"""
+        if game.turn.dice_left == 0:
+            return True
+        return self.search(game) == STOP
+
+    def rollouts_per_second(self):
+        """:returns the number of rollouts per second of search time, over all searches so far"""
+        return self.rollouts / self.search_time if self.search_time else 0.0
+
+    def close(self):
+        """stops the worker processes"""
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
@@ -0,0 +1,343 @@
+import os
+import sys
+import json
+import time
+import shlex
+import select
+import argparse
+import subprocess
+
+from dice import DiceStream, game_seed
+from rules import POINTS, Game, GreedyBot
+from profiling import Histogram
+from tournament import seating, make_bot, Standings
+
+# Protocol: the game sends one line of JSON per batch, {"id": n, "states": [state, ...]}, and the engine answers with
+# one line {"id": n, "decisions": [decision, ...]}, a decision for every state in the same order. A state is
+#   {"decide": "face" or "stop", "player": index, "players": number of players,
+#    "rolled": face-count vector of the roll or null, "parked": number of dice parked per face,
+#    "score": turn score, "dice_left": dice left, "dominos": dominos on the table, "lowest": lowest domino,
+#    "steal": upper dominos of the other players (null for no dominos), "claim": [domino, victim] or null,
+#    "stacks": dominos of every player, "worms": worms of every player}
+# Faces are indices into (1, 2, 3, 4, 5, 'worm'). For "face" the decision is the face index to park, for "stop" the
+# decision is "stop" or "roll". A stop is only asked when a domino can be taken and dice are left
+FACE, STOP = 'face', 'stop'
+
+
+def game_state(game, decide):
+    """:returns the protocol state of a rules.Game object at a decision"""
+    turn = game.turn
+    players = len(game.stacks)
+    return {'decide': decide, 'player': game.current, 'players': players,
+            'rolled': None if turn.rolled is None else list(turn.rolled), 'parked': turn.parked,
+            'score': turn.score, 'dice_left': turn.dice_left, 'dominos': sorted(game.table),
+            'lowest': min(game.table), 'steal': [game.top(j) for j in range(players) if j != game.current],
+            'claim': game.claim(), 'stacks': game.stacks, 'worms': [game.worms(p) for p in range(players)]}
+
+
+def next_decision(game):
+    """
+    Plays the moves of the current turn that need no decision, like rules.play_turn
+
+    :returns FACE or STOP, the decision the current player has to make, None when the game is over
+    """
+    while not game.game_over:
+        turn = game.turn
+        if turn.rolled is not None:
+            return FACE
+        if any(turn.parked) and game.claim() is not None:
+            if turn.dice_left == 0:
+                game.stop()
+                continue
+            return STOP
+        if turn.dice_left == 0:
+            game.bust()
+            continue
+        game.roll()
+        if not turn.options():
+            game.bust()
+    return None
+
+
+def play_decision(game, decide, decision):
+    """plays a FACE or STOP decision, raises ValueError for a decision that is not allowed"""
+    if decide == FACE:
+        game.select_face(int(decision))
+    elif decision == 'stop':
+        game.stop()
+    elif decision == 'roll':
+        game.roll()
+        if not game.turn.options():
+            game.bust()
+    else:
+        raise ValueError(f'{decision!r} is not stop or roll')
+
+
+def valid(game, decide, decision):
+    """:returns True when the decision can be played"""
+    if decide == FACE:
+        # bool is an int in Python, True would park face 1
+        return isinstance(decision, int) and not isinstance(decision, bool) and decision in game.turn.options()
+    return decision in ('stop', 'roll')
+
+
+class LocalBot:
+    def __init__(self, bot):
+        """
+        Initializes a LocalBot object that gives the batch interface of PipeBot to a bot object of this process
+
+        :arg bot: an object with the methods choose_face(game, options) and should_stop(game)
+        """
+        self.bot = bot
+
+    def decide(self, games, decides):
+        """:returns a list of decisions for a list of games and the decision each has to make"""
+        decisions = []
+        for game, decide in zip(games, decides):
+            if decide == FACE:
+                decisions.append(self.bot.choose_face(game, game.turn.options()))
+            else:
+                decisions.append('stop' if self.bot.should_stop(game) else 'roll')
+        return decisions
+
+    def stats(self):
+        return {}
+
+    def close(self):
+        if hasattr(self.bot, 'close'):
+            self.bot.close()
+
+
+class PipeBot:
+    def __init__(self, command, timeout=1.0, fallback=None):
+        """
+        Initializes a PipeBot object that asks an engine process for decisions with the protocol described above
+
+        :arg command: command line of the engine, a string or a list
+        :arg timeout: seconds the engine gets for a batch, after that the fallback bot decides the whole batch
+        :arg fallback: bot that decides when the engine is too late or gives a decision that is not allowed, a
+            rules.GreedyBot by default
+        """
+        self.command = shlex.split(command) if isinstance(command, str) else list(command)
+        self.timeout = timeout
+        self.fallback = LocalBot(fallback if fallback is not None else GreedyBot())
+        self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, bufsize=0)
+        # a batch can be larger than the pipe buffer, the writes wait in select so they keep to the deadline
+        os.set_blocking(self.process.stdin.fileno(), False)
+        self.buffer = b''
+        self.id = 0
+        self.latency = Histogram()
+        self.batches = 0
+        self.decisions = 0
+        self.timeouts = 0
+        self.invalid = 0
+        self.stopped = False
+
+    def write_line(self, data, deadline):
+        """:returns True when all bytes of data are written to the engine, False when the deadline passes first"""
+        fd = self.process.stdin.fileno()
+        view = memoryview(data)
+        while view:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0 or not select.select([], [fd], [], remaining)[1]:
+                return False
+            try:
+                view = view[os.write(fd, view):]
+            except BlockingIOError:
+                pass    # the engine read less than select promised, wait again
+        return True
+
+    def read_line(self, deadline):
+        """:returns the next line of the engine without the newline, None when the deadline passes first"""
+        fd = self.process.stdout.fileno()
+        while b'\n' not in self.buffer:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+                return None
+            data = os.read(fd, 65536)
+            if not data:
+                raise EOFError
+            self.buffer += data
+        line, _, self.buffer = self.buffer.partition(b'\n')
+        return line
+
+    def decide(self, games, decides):
+        """
+        :returns a list of decisions for a list of games and the decision each has to make, in one round trip. When the
+            engine has stopped the fallback bot decides all batches. The fallback bot is only asked for the decisions
+            the engine did not give in time or that are not allowed
+        """
+        self.batches += 1
+        self.decisions += len(games)
+        if self.stopped:
+            return self.fallback.decide(games, decides)
+        self.id += 1
+        request = {'id': self.id, 'states': [game_state(g, d) for g, d in zip(games, decides)]}
+        start = time.perf_counter()
+        deadline = start + self.timeout
+        decisions = None
+        try:
+            if not self.write_line((json.dumps(request) + '\n').encode(), deadline):
+                # the rest of a half written line would be read as part of the next batch, so the engine is given up
+                self.timeouts += 1
+                self.stop_engine('is too slow to read a batch')
+                return self.fallback.decide(games, decides)
+            while decisions is None:
+                line = self.read_line(deadline)
+                if line is None:
+                    break
+                try:
+                    answer = json.loads(line)
+                except ValueError:
+                    continue    # not an answer, like output of the engine that is not part of the protocol
+                # answers to batches that timed out earlier are skipped
+                if isinstance(answer, dict) and answer.get('id') == self.id:
+                    decisions = answer.get('decisions')
+        except (EOFError, BrokenPipeError):
+            self.stop_engine('stopped')
+            return self.fallback.decide(games, decides)
+        self.latency.record(time.perf_counter() - start)
+
+        if not isinstance(decisions, list) or len(decisions) != len(games):
+            self.timeouts += decisions is None
+            self.invalid += decisions is not None
+            return self.fallback.decide(games, decides)
+        wrong = [i for i in range(len(games)) if not valid(games[i], decides[i], decisions[i])]
+        if wrong:
+            self.invalid += len(wrong)
+            fallback = self.fallback.decide([games[i] for i in wrong], [decides[i] for i in wrong])
+            for i, decision in zip(wrong, fallback):
+                decisions[i] = decision
+        return decisions
+
+    def stop_engine(self, reason):
+        """gives up the engine, the fallback bot decides all batches from now on"""
+        self.stopped = True
+        print(f'engine {self.command[0]} {reason}, {self.fallback.bot.__class__.__name__} takes over', file=sys.stderr)
+
+    def stats(self):
+        """:returns a dictionary with the number of batches, decisions, timeouts and invalid decisions and the latency
+        of the batches in seconds"""
+        return {'batches': self.batches, 'decisions': self.decisions, 'timeouts': self.timeouts,
+                'invalid': self.invalid, 'stopped': self.stopped, 'latency': self.latency.to_dict()}
+
+    def close(self):
+        """stops the engine"""
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        try:
+            self.process.wait(self.timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+def play_batched(bots, games, seed=0, batch=256, rotate=True):
+    """
+    :arg bots: dictionary of bot name and LocalBot or PipeBot object, the names are the players of every game
+    :arg games: number of games
+    :arg seed: integer seed, game number g uses the same dice as game g of tournament.run_tournament
+    :arg batch: number of games played at the same time, the decisions of all these games are asked from each bot in
+        one batch
+
+    Plays games without a window, every round all games waiting for a bot get their decisions in one call of its
+    decide method
+
+    :returns a generator of the results of the games, dictionaries like tournament.play_seeded_game
+    """
+    names = list(bots)
+    todo = iter(range(games))
+    active = []
+
+    def start_game():
+        g = next(todo, None)
+        if g is not None:
+            players = seating(names, g, rotate)
+            active.append((g, players, Game(len(players), DiceStream(game_seed(seed, g)))))
+
+    for _ in range(batch):
+        start_game()
+    while active:
+        waiting = {name: [] for name in names}
+        for entry in list(active):
+            g, players, game = entry
+            decide = next_decision(game)
+            if decide is None:
+                active.remove(entry)
+                worms = [game.worms(p) for p in range(len(players))]
+                yield {'game': g, 'seed': seed, 'players': players, 'worms': worms, 'winners': game.winners(),
+                       'stacks': game.stacks, 'flipped': game.flipped, 'history': game.history}
+                start_game()
+            else:
+                waiting[players[game.current]].append((game, decide))
+        for name, pending in waiting.items():
+            if pending:
+                decisions = bots[name].decide([p[0] for p in pending], [p[1] for p in pending])
+                for (game, decide), decision in zip(pending, decisions):
+                    play_decision(game, decide, decision)
+
+
+def greedy_decision(state):
+    """:returns the decision of a rules.GreedyBot from a protocol state, a reference for engines in other languages"""
+    if state['decide'] == STOP:
+        return 'stop'
+    rolled, parked = state['rolled'], state['parked']
+    options = [f for f in range(6) if rolled[f] and not parked[f]]
+    return max(options, key=lambda f: (POINTS[f] * rolled[f], f))
+
+
+def serve(decision=greedy_decision, stdin=None, stdout=None):
+    """answers the batches of the protocol on stdin with the decisions of a function of a state, until stdin closes"""
+    stdin = stdin if stdin is not None else sys.stdin
+    stdout = stdout if stdout is not None else sys.stdout
+    for line in stdin:
+        request = json.loads(line)
+        stdout.write(json.dumps({'id': request['id'], 'decisions': [decision(s) for s in request['states']]}) + '\n')
+        stdout.flush()
+
+
+def main(argv=None):
+    """command line entry point, plays games between engines and bots or runs the reference engine with --serve"""
+    parser = argparse.ArgumentParser(description='Play Regenwormen games with bot engines speaking JSON over pipes')
+    parser.add_argument('bots', nargs='*', help="bot names (greedy, solver, mcts, policy, 'module:Class') or engine "
+                                                "commands prefixed with 'pipe:', one for each player")
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--batch', type=int, default=256, help='number of games played at the same time')
+    parser.add_argument('--timeout', type=float, default=1.0, help='seconds an engine gets for a batch')
+    parser.add_argument('--serve', action='store_true', help='run the greedy reference engine on stdin and stdout')
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        serve()
+        return
+    if not 2 <= len(args.bots) <= 6:
+        parser.error('a game has 2 to 6 players')
+
+    bots = {}
+    for i, name in enumerate(args.bots):
+        key = f'{name} ({i + 1})' if name in bots else name
+        if name.startswith('pipe:'):
+            bots[key] = PipeBot(name[5:], args.timeout)
+        else:
+            bots[key] = LocalBot(make_bot(name))
+    standings = Standings()
+    start = time.perf_counter()
+    for result in play_batched(bots, args.games, args.seed, args.batch):
+        standings.add(result)
+    seconds = time.perf_counter() - start
+    print(standings)
+    print(f'{args.games / seconds:.0f} games/s')
+    for name, bot in bots.items():
+        stats = bot.stats()
+        if stats:
+            latency = stats['latency']
+            print(f'{name}: {stats["batches"]} batches, {stats["decisions"]} decisions, {stats["timeouts"]} '
+                  f'timeouts, {stats["invalid"]} invalid, latency mean {latency["mean"] * 1e3:.2f} ms, '
+                  f'p99 {latency["p99"] * 1e3:.2f} ms, max {latency["max"] * 1e3:.2f} ms')
+        bot.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,325 @@
+import os
+import sys
+import mmap
+import time
+import struct
+import argparse
+
+import numpy as np
+
+from itertools import combinations
+from multiprocessing import Pool
+
+from dice import marginal
+from rules import POINTS, WORM, NUM_DICE, MAX_SCORE, DOMINO_VALUES, lower_table
+from solver import WORM_BIT, parked_mask
+from state import MAX_PLAYERS
+
+# A policy file holds the best play of every turn state for every configuration of the dominos: the expected worms
+# of the state as int16 in units of 1 / VALUE_SCALE worm, and a bit that is 1 when stopping is allowed and worth at
+# least as much as rolling again.
+#
+# The best play of a turn only depends on the worms each turn score takes (21 to 40) and on the worms lost when the
+# turn fails, a configuration is encoded as an integer with a base 5 digit of worms per score and the lost worms in
+# the highest digit. The worms taken from the table follow from the lowest domino on the table of each group of
+# dominos with the same worms (21-24, 25-28, 29-32, 33-36), a table class, and the upper dominos of the other players
+# add the worms of their scores, up to MAX_PLAYERS - 1 steals. A turn state can only end with the scores from its own
+# score to its score plus 5 per die left, its window, so its value only depends on the digits of those scores: the
+# states with the same window share a block with a row per distinct code of their digits, which holds every
+# configuration with any number of steals in a fraction of the size of a row per configuration.
+#
+# After the header follow the number of rows of every window (int64), the sorted codes of the rows of every window
+# (int64), the blocks of values of every window (rows x states of the window) and the bits of the same blocks
+MAGIC = b'PKMP'
+VERSION = 2
+HEADER = struct.Struct('<4sHHIIQ')  # magic, version, windows, states, rows, values
+VALUE_SCALE = 2 ** 12
+GROUPS = 4
+GROUP_OPTIONS = 5                   # offset 0 to 3 of the lowest domino of a group, 4 when the group is not on the table
+NUM_CLASSES = GROUP_OPTIONS ** GROUPS
+MAX_BUST = 4
+POLICY_FILE = 'policy.bin'
+
+LOW_SCORE = min(DOMINO_VALUES)      # scores below it take no domino
+BASE = MAX_BUST + 1                 # a digit holds 0 to 4 worms
+BUST_DIGIT = BASE ** (MAX_SCORE - LOW_SCORE + 1)
+
+
+def turn_states():
+    """:returns a sorted list of all (mask, score, dice_left) turn states that can be reached after choosing a face"""
+    seen = set()
+    todo = [(0, 0, NUM_DICE)]
+    while todo:
+        state = todo.pop()
+        if state in seen:
+            continue
+        seen.add(state)
+        mask, score, dice_left = state
+        for f in range(6):
+            if not mask >> f & 1:
+                for c in range(1, dice_left + 1):
+                    todo.append((mask | 1 << f, score + POINTS[f] * c, dice_left - c))
+    seen.discard((0, 0, NUM_DICE))
+    return sorted(seen)
+
+
+def window(score, dice_left):
+    """:returns a tuple (low, high) of the scores taking a domino a turn state can end with, high = low - 1 when none"""
+    high = min(score + POINTS[WORM] * dice_left, MAX_SCORE)
+    return (max(score, LOW_SCORE), high) if high >= LOW_SCORE else (LOW_SCORE, LOW_SCORE - 1)
+
+
+def project(codes, low, high):
+    """:returns an int64 array with the codes of the configurations holding only the digits of the scores low to high"""
+    digit = BASE ** (low - LOW_SCORE)
+    return codes // digit % BASE ** (high - low + 1) * digit
+
+
+def class_tiles(index):
+    """:returns the lowest domino of each group on the table of a table class"""
+    tiles = []
+    for g in reversed(range(GROUPS)):
+        index, offset = divmod(index, GROUP_OPTIONS)
+        if offset < GROUP_OPTIONS - 1:
+            tiles.append(21 + 4 * g + offset)
+    return sorted(tiles)
+
+
+def worm_codes():
+    """
+    :returns a sorted int64 array with the codes of the worms per score of all table classes and steals, without the
+        worms lost when the turn fails
+    """
+    codes = set()
+    for c in range(NUM_CLASSES):
+        lower = lower_table(class_tiles(c))
+        code, digits, steals = 0, {}, []
+        for score in range(LOW_SCORE, MAX_SCORE + 1):
+            digits[score] = BASE ** (score - LOW_SCORE)
+            worms = DOMINO_VALUES[lower[score]] if lower[score] is not None else 0
+            code += worms * digits[score]
+            if score in DOMINO_VALUES and DOMINO_VALUES[score] > worms:
+                steals.append((DOMINO_VALUES[score] - worms) * digits[score])
+        for k in range(min(len(steals), MAX_PLAYERS - 1) + 1):
+            for gains in combinations(steals, k):
+                codes.add(code + sum(gains))
+    return np.array(sorted(codes), np.int64)
+
+
+# column of every turn state in the block of its window
+STATES = turn_states()
+STATE_INDEX = {state: i for i, state in enumerate(STATES)}
+WINDOWS = sorted({window(score, dice_left) for mask, score, dice_left in STATES})
+WINDOW_STATES = [[i for i, (mask, score, dice_left) in enumerate(STATES) if window(score, dice_left) == w]
+                 for w in WINDOWS]
+STATE_WINDOW = [WINDOWS.index(window(score, dice_left)) for mask, score, dice_left in STATES]
+STATE_COLUMN = [WINDOW_STATES[w].index(i) for i, w in enumerate(STATE_WINDOW)]
+
+
+def solve(bust_worms):
+    """
+    :arg bust_worms: worms lost when the turn fails
+
+    Solves the turn states for the codes of all configurations at once, from the states without dice left up, with
+    the same recursion as solver.TurnValues on arrays with a value per code of the window of the state
+
+    :returns a list with a tuple of arrays (codes, values, stop) per window, with a row per code of the window
+    """
+    codes = worm_codes()
+    keys = [np.unique(project(codes, low, high)) for low, high in WINDOWS]
+    values = [None] * len(STATES)
+    stop = [None] * len(STATES)
+    for i in sorted(range(len(STATES)), key=lambda i: STATES[i][2]):
+        mask, score, dice_left = STATES[i]
+        key = keys[STATE_WINDOW[i]]
+        faces = [f for f in range(6) if not mask >> f & 1]
+
+        # values after parking c dice of face f, per face that can still be chosen
+        children = []
+        for f in faces:
+            row = [None]
+            for c in range(1, dice_left + 1):
+                j = STATE_INDEX[mask | 1 << f, score + POINTS[f] * c, dice_left - c]
+                child = keys[STATE_WINDOW[j]].searchsorted(project(key, *WINDOWS[STATE_WINDOW[j]]))
+                row.append(values[j][child])
+            children.append(row)
+
+        roll = np.full(len(key), -float(bust_worms))
+        if dice_left and faces:
+            roll[:] = 0.0
+            for p, counts in marginal(dice_left, len(faces)):
+                best = None
+                for row, c in zip(children, counts):
+                    if c:
+                        best = row[c] if best is None else np.maximum(best, row[c])
+                roll += p * best if best is not None else -p * bust_worms
+
+        values[i], stop[i] = roll, np.zeros(len(key), bool)
+        if mask & WORM_BIT and score >= LOW_SCORE:
+            reward = key // BASE ** (score - LOW_SCORE) % BASE
+            stop[i] = (reward > 0) & (reward >= roll)
+            values[i] = np.where(stop[i], reward, roll)
+
+    blocks = []
+    for w, states in enumerate(WINDOW_STATES):
+        block = np.rint(np.stack([values[i] for i in states], axis=1) * VALUE_SCALE).astype(np.int16)
+        blocks.append((keys[w] + bust_worms * BUST_DIGIT, block, np.stack([stop[i] for i in states], axis=1)))
+    return blocks
+
+
+def build(path=POLICY_FILE, workers=None):
+    """
+    Solves the turns of all configurations on a pool of processes, one for each number of worms lost when the turn
+    fails, and writes the policy file. The file is written under a temporary name first, so a reader never maps half
+    a file
+    """
+    with Pool(workers or os.cpu_count()) as pool:
+        solved = pool.map(solve, range(MAX_BUST + 1))
+    keys = [np.concatenate([s[w][0] for s in solved]) for w in range(len(WINDOWS))]
+    values = [np.concatenate([s[w][1] for s in solved]) for w in range(len(WINDOWS))]
+    stop = np.concatenate([np.concatenate([s[w][2] for s in solved]).ravel() for w in range(len(WINDOWS))])
+    rows = sum(len(k) for k in keys)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(WINDOWS), len(STATES), rows, len(stop)))
+        f.write(np.array([len(k) for k in keys], np.int64).tobytes())
+        for k in keys:
+            f.write(k.tobytes())
+        for v in values:
+            f.write(v.tobytes())
+        f.write(np.packbits(stop).tobytes())
+    os.replace(path + '.tmp', path)
+
+
+class PolicyTable:
+    def __init__(self, path=POLICY_FILE):
+        """
+        Initializes a PolicyTable object that maps a policy file in memory, the arrays share the pages of the file, so
+        opening it takes no time and all processes using the same file share one copy
+
+        :arg path: name of the policy file written by build
+        """
+        self.path = path
+        self.file = open(path, 'rb')
+        magic, version, windows, states, rows, size = HEADER.unpack(self.file.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a policy file')
+        if version != VERSION:
+            raise ValueError(f'{path} has version {version}, only version {VERSION} can be read')
+        if windows != len(WINDOWS) or states != len(STATES):
+            raise ValueError(f'{path} was built for other turn states, build it again')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        offset = HEADER.size
+        counts = np.frombuffer(self.map, np.int64, windows, offset)
+        offset += counts.nbytes
+        self.keys, self.values, self.starts = [], [], []
+        for n in counts:
+            self.keys.append(np.frombuffer(self.map, np.int64, n, offset))
+            offset += 8 * n
+        start = 0
+        for n, states in zip(counts, WINDOW_STATES):
+            self.values.append(np.frombuffer(self.map, np.int16, n * len(states), offset).reshape(n, len(states)))
+            self.starts.append(start)
+            offset += 2 * n * len(states)
+            start += n * len(states)
+        self.stop = np.frombuffer(self.map, np.uint8, (size + 7) // 8, offset)
+
+    def entry(self, prefix, bust, state):
+        """
+        :arg prefix: list with the code of the worms of the scores below LOW_SCORE + k at index k
+        :arg bust: code of the worms lost when the turn fails
+        :arg state: index of a turn state in STATES
+
+        :returns a tuple (window, row, column) of the value of the state in the blocks of the file
+        """
+        w = STATE_WINDOW[state]
+        low, high = WINDOWS[w]
+        code = bust + prefix[high - LOW_SCORE + 1] - prefix[low - LOW_SCORE]
+        keys = self.keys[w]
+        row = int(keys.searchsorted(code))
+        if row == len(keys) or keys[row] != code:
+            raise ValueError(f'{self.path} does not hold the configuration, build it again')
+        return w, row, STATE_COLUMN[state]
+
+    def value(self, prefix, bust, state):
+        """:returns the expected worms of the best play in a turn state in units of 1 / VALUE_SCALE worm"""
+        w, row, column = self.entry(prefix, bust, state)
+        return self.values[w][row, column]
+
+    def should_stop(self, prefix, bust, state):
+        """:returns True when stopping is allowed in a turn state and worth at least as much as rolling again"""
+        w, row, column = self.entry(prefix, bust, state)
+        bit = self.starts[w] + row * len(WINDOW_STATES[w]) + column
+        return bool(self.stop[bit >> 3] >> (7 - (bit & 7)) & 1)
+
+    def close(self):
+        self.keys = self.values = self.stop = None
+        self.map.close()
+        self.file.close()
+
+
+class PolicyBot:
+    def __init__(self, path=POLICY_FILE):
+        """
+        Initializes a PolicyBot object that plays the moves with the highest expected worms of the current turn, like
+        solver.SolverBot, by reading them from a policy file, which holds every configuration of games with up to
+        MAX_PLAYERS players
+
+        :arg path: name of the policy file
+        """
+        self.table = PolicyTable(path)
+
+    def codes(self, game):
+        """
+        :arg game: a rules.Game object
+
+        :returns a tuple (prefix, bust) of the configuration of the current turn, see PolicyTable.entry
+        """
+        steals = [game.top(j) for j in range(len(game.stacks)) if j != game.current]
+        prefix, code, digit = [0], 0, 1
+        for score in range(LOW_SCORE, MAX_SCORE + 1):
+            domino = score if score in steals else game.lower[score]
+            if domino is not None:
+                code += DOMINO_VALUES[domino] * digit
+            prefix.append(code)
+            digit *= BASE
+        top = game.top(game.current)
+        return prefix, (DOMINO_VALUES[top] if top is not None else 0) * BUST_DIGIT
+
+    def choose_face(self, game, options):
+        """:returns the face to park from the list of options"""
+        prefix, bust = self.codes(game)
+        turn = game.turn
+        mask, score, rolled, dice_left = parked_mask(turn.parked), turn.score, turn.rolled, turn.dice_left
+        best, best_value = None, None
+        for f in options:
+            c = rolled[f]
+            v = self.table.value(prefix, bust, STATE_INDEX[mask | 1 << f, score + POINTS[f] * c, dice_left - c])
+            if best is None or v > best_value:
+                best, best_value = f, v
+        return best
+
+    def should_stop(self, game):
+        """:returns True to stop the turn, only called when stopping is allowed"""
+        prefix, bust = self.codes(game)
+        turn = game.turn
+        return self.table.should_stop(prefix, bust, STATE_INDEX[parked_mask(turn.parked), turn.score, turn.dice_left])
+
+    def close(self):
+        self.table.close()
+
+
+def main(argv=None):
+    """command line entry point, builds the policy file"""
+    parser = argparse.ArgumentParser(description='Build the policy file of the best moves of every turn')
+    parser.add_argument('--out', default=POLICY_FILE)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    build(args.out, args.workers)
+    print(f'{len(STATES)} turn states in {len(WINDOWS)} windows written to {args.out} '
+          f'({os.path.getsize(args.out) / 2 ** 20:.1f} MB) in {time.perf_counter() - start:.0f} s')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
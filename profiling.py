@@ -0,0 +1,172 @@
+import json
+import math
+import time
+
+# histogram buckets: BUCKETS_PER_OCTAVE buckets per doubling of the time, from 1 microsecond to about 16 seconds
+BUCKETS_PER_OCTAVE = 4
+NUM_BUCKETS = 24 * BUCKETS_PER_OCTAVE
+
+
+class Histogram:
+    def __init__(self):
+        """
+        Initializes a Histogram object of durations with a fixed number of logarithmic buckets, so it takes the same
+        memory whether it holds ten or ten million durations
+        """
+        self.buckets = [0] * NUM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def record(self, seconds):
+        """adds a duration in seconds to the histogram"""
+        micro = seconds * 1e6
+        i = int(math.log2(micro) * BUCKETS_PER_OCTAVE) + 1 if micro >= 1 else 0
+        self.buckets[min(i, NUM_BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def mean(self):
+        """:returns the mean duration in seconds"""
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, p):
+        """:returns the upper bound in seconds of the bucket holding the p-th percentile (0-100) of the durations"""
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank and n:
+                return min(2 ** (i / BUCKETS_PER_OCTAVE) / 1e6, self.max)
+        return self.max
+
+    def to_dict(self):
+        """:returns a dictionary with the statistics and non-empty buckets (upper bound in microseconds: count)"""
+        return {'count': self.count, 'mean': self.mean(), 'min': self.min if self.count else 0.0, 'max': self.max,
+                'p50': self.percentile(50), 'p95': self.percentile(95), 'p99': self.percentile(99),
+                'buckets': {round(2 ** (i / BUCKETS_PER_OCTAVE), 1): n for i, n in enumerate(self.buckets) if n}}
+
+
+class Profiler:
+    """Profiler of the game window, pygame is only imported by the methods that draw or read events, so the histograms
+    can be used without it"""
+
+    overlay_interval = 0.5  # seconds between updates of the overlay
+    # area of the overlay in the game window, the empty space between the dominos on the table, the dice and the
+    # 'Dobbelen' button, nothing else is drawn there so the overlay never hides a part of the game
+    overlay_area = (0, 240, 420, 150)
+
+    def __init__(self, path='profile.json', overlay=False):
+        """
+        Initializes a Profiler object that times the phases of a turn, the frames and the input latency of a game
+        window in Histogram objects. The timed functions are only replaced by timing wrappers while the profiler is
+        installed, a game without profiler runs the original functions
+
+        :arg path: JSON file the statistics are written to by dump, None to not write them
+        :arg overlay: boolean, show the statistics in the game window, left of the dice
+        """
+        self.path = path
+        self.overlay = overlay
+        self.histograms = {}
+        self.originals = []
+        self.games = 0
+        self.wake_time = None
+        self.input = False
+        self.overlay_time = 0.0
+        self.font = None
+        self.font_lines = 0
+
+    def histogram(self, name):
+        """:returns the Histogram object with the name, created on first use"""
+        if name not in self.histograms:
+            self.histograms[name] = Histogram()
+        return self.histograms[name]
+
+    def timed(self, func, name):
+        """:returns a function that calls func and records its duration in histogram name"""
+        histogram = self.histogram(name)
+
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.record(time.perf_counter() - start)
+        return wrapper
+
+    def install(self, hooks):
+        """
+        :arg hooks: list of (object, attribute name, histogram name) of the functions and methods to time
+
+        Replaces each attribute with a timing wrapper, the original attributes are restored by uninstall
+        """
+        for owner, attr, name in hooks:
+            func = owner.__dict__[attr] if isinstance(owner, type) else getattr(owner, attr)
+            self.originals.append((owner, attr, func))
+            setattr(owner, attr, self.timed(func, name))
+
+    def uninstall(self):
+        """restores the functions replaced by install"""
+        for owner, attr, func in reversed(self.originals):
+            setattr(owner, attr, func)
+        self.originals = []
+
+    def wake(self, events):
+        """
+        :arg events: the pygame events the game loop woke up with
+
+        Starts the timing of a frame. Pygame events carry no time stamp, so the input latency is measured from the
+        moment the game loop takes the event from the queue
+        """
+        import pygame
+        self.wake_time = time.perf_counter()
+        self.input = any(e.type in (pygame.MOUSEBUTTONDOWN, pygame.KEYDOWN) for e in events)
+
+    def frame(self, screen):
+        """
+        :arg screen: the render.DirtyScreen object of the game window
+
+        Ends the timing of a frame after its pixels have been pushed to the display, and redraws the overlay
+        """
+        now = time.perf_counter()
+        self.histogram('frame').record(now - self.wake_time)
+        if self.input:
+            self.histogram('input latency').record(now - self.wake_time)
+        if self.overlay and now - self.overlay_time > Profiler.overlay_interval:
+            self.overlay_time = now
+            self.draw_overlay(screen)
+
+    def draw_overlay(self, screen):
+        """draws the mean, 95th percentile and maximum of every histogram in milliseconds on the screen"""
+        import pygame
+        lines = [f'{"":14}{"mean":>7}{"p95":>7}{"max":>7}{"n":>7}']
+        for name, h in sorted(self.histograms.items()):
+            lines.append(f'{name:14}{h.mean() * 1e3:7.2f}{h.percentile(95) * 1e3:7.2f}{h.max * 1e3:7.2f}{h.count:7}')
+        area = pygame.Rect(Profiler.overlay_area)
+        if self.font is None or self.font_lines != len(lines):
+            # the largest font up to size 16 that fits all lines in the area
+            size = 16
+            self.font = pygame.font.SysFont('consolas', size)
+            while size > 8 and self.font.get_linesize() * len(lines) + 10 > area.height:
+                size -= 1
+                self.font = pygame.font.SysFont('consolas', size)
+            self.font_lines = len(lines)
+        height = self.font.get_linesize()
+        screen.fill(pygame.Color('black'), area)
+        for i, line in enumerate(lines[:(area.height - 10) // height]):
+            screen.blit(self.font.render(line, True, pygame.Color('white')), (area.x + 5, area.y + 5 + i * height))
+
+    def to_dict(self):
+        """:returns a dictionary with the statistics of all histograms in seconds"""
+        return {'games': self.games, 'histograms': {k: h.to_dict() for k, h in self.histograms.items()}}
+
+    def dump(self):
+        """writes the statistics so far to the JSON file self.path"""
+        if self.path is not None:
+            with open(self.path, 'w') as f:
+                json.dump(self.to_dict(), f, indent=2)
@@ -0,0 +1,254 @@
+import os
+import mmap
+import struct
+
+import numpy as np
+
+from rules import Game
+
+# A record file starts with a header followed by fixed-size events, the events of one game are stored together and
+# start with a GAME event. The index file next to it (record file + '.idx') has a header and one entry per game with
+# the number of its first event and its number of events, so a reader can go to any game without reading the others
+MAGIC = b'PKMR'
+INDEX_MAGIC = b'PKMI'
+VERSION = 1
+HEADER = struct.Struct('<4sHH')    # magic, version, size of an event or index entry
+EVENT = struct.Struct('<BBBBI')    # kind, player, a, b, c
+INDEX_ENTRY = struct.Struct('<QI')  # first event, number of events
+EVENT_DTYPE = np.dtype([('kind', 'u1'), ('player', 'u1'), ('a', 'u1'), ('b', 'u1'), ('c', '<u4')])
+INDEX_DTYPE = np.dtype([('start', '<u8'), ('count', '<u4')])
+
+# event kinds and the meaning of their fields, NO_PLAYER and 0 stand for no player and no domino
+GAME = 0    # player: number of players, c: number of the game
+ROLL = 1    # player, c: face-count vector of the roll, 4 bits per face
+SELECT = 2  # player, a: face index, b: number of dice, c: turn score after parking them
+STOP = 3    # player, c: turn score
+TAKE = 4    # player, a: domino, b: player the domino is stolen from
+BUST = 5    # player, a: domino returned to the table
+FLIP = 6    # player, a: domino turned over
+END = 7     # player: number of players
+KINDS = ('game', 'roll', 'select', 'stop', 'take', 'bust', 'flip', 'end')
+NO_PLAYER = 255
+
+
+def pack_roll(counts):
+    """:returns a face-count vector packed in an integer, 4 bits per face"""
+    packed = 0
+    for f in range(6):
+        packed |= counts[f] << (4 * f)
+    return packed
+
+
+def unpack_roll(packed):
+    """:returns the face-count vector of a roll packed by pack_roll"""
+    return tuple(packed >> (4 * f) & 15 for f in range(6))
+
+
+class GameRecord:
+    def __init__(self, players, number=0):
+        """
+        Initializes a GameRecord object that collects the events of one game in memory
+
+        :arg players: number of players in the game
+        :arg number: number of the game, stored in the GAME event
+        """
+        self.players = players
+        self.data = bytearray()
+        self.count = 0
+        self.add(GAME, players, c=number)
+
+    def add(self, kind, player, a=0, b=0, c=0):
+        """adds an event to the record"""
+        self.data += EVENT.pack(kind, player, a, b, c)
+        self.count += 1
+
+
+class RecordedGame(Game):
+    """rules.Game that records every roll, choice and domino move in a GameRecord, written to a RecordWriter when the
+    game is over"""
+
+    def __init__(self, players, rng=None, writer=None, number=0):
+        super(RecordedGame, self).__init__(players, rng)
+        self.writer = writer
+        self.record = GameRecord(players, number)
+
+    def roll(self):
+        rolled = super(RecordedGame, self).roll()
+        self.record.add(ROLL, self.current, c=pack_roll(rolled))
+        return rolled
+
+    def select_face(self, face):
+        n = self.turn.rolled[face] if self.turn.rolled is not None else 0
+        points = super(RecordedGame, self).select_face(face)
+        self.record.add(SELECT, self.current, face, n, self.turn.score)
+        return points
+
+    def stop(self):
+        player, score = self.current, self.turn.score
+        result = super(RecordedGame, self).stop()
+        if result is not None:
+            domino, victim = result
+            self.record.add(STOP, player, c=score)
+            self.record.add(TAKE, player, domino, NO_PLAYER if victim is None else victim)
+            self.end_of_game()
+        return result
+
+    def bust(self):
+        player = self.current
+        returned, flipped = super(RecordedGame, self).bust()
+        self.record.add(BUST, player, returned or 0)
+        if flipped is not None:
+            self.record.add(FLIP, player, flipped)
+        self.end_of_game()
+        return returned, flipped
+
+    def end_of_game(self):
+        """closes the record and writes it to the writer, when the game is over"""
+        if self.game_over:
+            self.record.add(END, len(self.stacks))
+            if self.writer is not None:
+                self.writer.write(self.record)
+
+
+def check_header(f, magic, size):
+    """reads and checks the header of a record or index file, an empty file gets a new header"""
+    data = f.read(HEADER.size)
+    if not data:
+        f.write(HEADER.pack(magic, VERSION, size))
+        return
+    file_magic, version, file_size = HEADER.unpack(data)
+    if file_magic != magic or file_size != size:
+        raise ValueError(f'{f.name} is not a game record file')
+    if version != VERSION:
+        raise ValueError(f'{f.name} has version {version}, only version {VERSION} can be read')
+
+
+class RecordWriter:
+    def __init__(self, path):
+        """
+        Initializes a RecordWriter object that appends complete games to a record file and its index, an existing file
+        is continued. A game is only added to the index after its events are written, so the games in the index are
+        always complete, also when a writer is stopped halfway. The part of an event or index entry a stopped writer
+        left at the end of a file is cut off, so the events appended after it stay aligned
+
+        :arg path: name of the record file
+        """
+        self.path = path
+        self.file = open(path, 'a+b')
+        self.index = open(path + '.idx', 'a+b')
+        for f, magic, size in ((self.file, MAGIC, EVENT.size), (self.index, INDEX_MAGIC, INDEX_ENTRY.size)):
+            f.seek(0)
+            check_header(f, magic, size)
+            f.seek(0, os.SEEK_END)
+        self.games = (self.index.tell() - HEADER.size) // INDEX_ENTRY.size
+        self.events = (self.file.tell() - HEADER.size) // EVENT.size
+        self.index.truncate(HEADER.size + self.games * INDEX_ENTRY.size)
+        self.file.truncate(HEADER.size + self.events * EVENT.size)
+
+    def write(self, record):
+        """
+        :arg record: a GameRecord object, or the bytes of its events
+
+        Appends the events of one game to the record file and its entry to the index
+        """
+        data = record.data if isinstance(record, GameRecord) else record
+        count = len(data) // EVENT.size
+        self.file.write(data)
+        self.file.flush()
+        self.index.write(INDEX_ENTRY.pack(self.events, count))
+        self.index.flush()
+        self.events += count
+        self.games += 1
+
+    def close(self):
+        self.file.close()
+        self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RecordReader:
+    def __init__(self, path):
+        """
+        Initializes a RecordReader object that maps a record file in memory, the events are numpy structured arrays of
+        EVENT_DTYPE that share the pages of the file, so a reader of a large file uses little memory
+
+        :arg path: name of the record file, the index is rebuilt from the GAME and END events when its file is missing
+        """
+        self.path = path
+        self.file = open(path, 'rb')
+        check_header(self.file, MAGIC, EVENT.size)
+        size = os.path.getsize(path)
+        count = (size - HEADER.size) // EVENT.size
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if count else None
+        self.events = np.frombuffer(self.map, EVENT_DTYPE, count, HEADER.size) if count else np.zeros(0, EVENT_DTYPE)
+
+        if os.path.exists(path + '.idx'):
+            with open(path + '.idx', 'rb') as f:
+                check_header(f, INDEX_MAGIC, INDEX_ENTRY.size)
+                data = f.read()
+            # an entry being written by a running writer is left out
+            self.index = np.frombuffer(data, INDEX_DTYPE, len(data) // INDEX_ENTRY.size)
+        else:
+            self.index = self.build_index()
+
+    def build_index(self):
+        """
+        :returns the index of the complete games, found from the GAME and END events. Every END belongs to the last
+            GAME before it, a GAME without END, left by a writer that was stopped in the middle of a game, is skipped
+        """
+        starts = np.flatnonzero(self.events['kind'] == GAME)
+        ends = np.flatnonzero(self.events['kind'] == END)
+        games = np.searchsorted(starts, ends) - 1
+        ends = ends[games >= 0]
+        starts = starts[games[games >= 0]]
+        index = np.zeros(len(starts), INDEX_DTYPE)
+        index['start'] = starts
+        index['count'] = ends - starts + 1
+        return index
+
+    def __len__(self):
+        """:returns the number of games"""
+        return len(self.index)
+
+    def game(self, i):
+        """:returns the events of game i as an array of EVENT_DTYPE"""
+        start, count = self.index[i]
+        return self.events[start:start + count]
+
+    def __iter__(self):
+        for i in range(len(self.index)):
+            yield self.game(i)
+
+    def chunks(self, games=10000):
+        """
+        :returns a generator of the events of a number of consecutive games at a time, as arrays of EVENT_DTYPE. The
+            events between the games of the index, of games that were not finished, are left out
+        """
+        for i in range(0, len(self.index), games):
+            starts = self.index['start'][i:i + games]
+            counts = self.index['count'][i:i + games]
+            end = int(starts[-1] + counts[-1])
+            if end - starts[0] == counts.sum():
+                yield self.events[starts[0]:end]
+            else:
+                yield np.concatenate([self.events[s:s + c] for s, c in zip(starts, counts)])
+
+    def close(self):
+        self.events = None
+        if self.map is not None:
+            try:
+                self.map.close()
+            except BufferError:
+                pass  # arrays of events are still in use, the map is closed when they are freed
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,37 +1,65 @@
+import os
 import sys
+import argparse
 import pygame
-import random
 
-from game_menu import *
+from rules import *
+from assets import *
+from render import *
+from dice import DiceStream, game_seed
+from profiling import Profiler
 from pygame.locals import *
+from functools import lru_cache
 from collections import OrderedDict
-from PyQt5.QtWidgets import QApplication
 
-# Initiate pygame environment
-pygame.init()
+# get current working directory, the images are in its images folder
+PATH = os.getcwd()
+
+# ImageAtlas object with all images of the game window, created once by init_display
+IMAGES = None
+
+# rendered texts of the game window, the same texts are drawn again every turn
+TEXTS = TextCache()
+
+# default maximum number of frames per second of the game window
+FPS = 60
+
+# maximum time in milliseconds the game loop sleeps while waiting for an event, and between moves of a computer player
+EVENT_TIMEOUT = 250
+BOT_DELAY = 400
+
+# phases of a turn in a GameSession
+SELECTING, ROLLING, STOPPED, BUST, GAME_OVER = 'selecting', 'rolling', 'stopped', 'bust', 'game over'
+
+# font of all texts in the game window
+FONT = 'cambria'
+
+# environment variable with the JSON file of the profiling statistics, profiling is switched on when it is set
+PROFILE_VARIABLE = 'REGENWORMEN_PROFILE'
+
+# event posted by the coach.Coach worker when the hints of the current turn are ready, and the screen area they use
+HINTS = USEREVENT
+HINTS_AREA = (1250, 240, 450, 150)
 
 
 class Die:
-    def __init__(self, pos):
+    def __init__(self, pos, value):
         """
         Initializes a Die object
 
         pos: position/coordinate of the Die object on the pygame window
+        value: the rolled value of the die, 1 to 5 or 'worm'
         """
         super(Die, self).__init__()
-        path = PATH + "/images/"
-        self.dies = {path + "dobbel_1.png": 1, path + "dobbel_2.png": 2, path + "dobbel_3.png": 3,
-                     path + "dobbel_4.png": 4, path + "dobbel_5.png": 5, path + "dobbel_w1.png": 'worm'}
-        init_die = random.choice(list(self.dies.keys()))
-        self.die_value = self.dies[init_die]
-        self.surf = pygame.image.load(init_die).convert()
+        self.dies = DIE_IMAGES
+        self.die_value = value
+        self.surf = IMAGES.get(self.dies[value])
         self.rect = self.surf.get_rect(center=pos)
 
-    def roll(self):
+    def roll(self, value):
         """:returns an updated image surface when a die gets a new value after rolling it"""
-        update_die = random.choice(list(self.dies.keys()))
-        self.die_value = self.dies[update_die]
-        self.surf = pygame.image.load(update_die).convert()
+        self.die_value = value
+        self.surf = IMAGES.get(self.dies[value])
         return self.surf
 
     def get_value(self):
@@ -48,25 +76,29 @@ class Die:
 
 
 class Throw:
-    def __init__(self):
-        """Initializes a Throw of Dies object, consisting of 8 new dice on the screen"""
+    def __init__(self, game):
+        """
+        Initializes a Throw of Dies object, consisting of 8 new dice on the screen
+
+        :arg game: the rules.Game object that rolls the dice with its random generator and keeps the score of the turn
+        """
         super(Throw, self).__init__()
+        self.game = game
         self.throw = {}
         self.init_throw()
 
         # clear parked dice from previous player
-        erase = pygame.Surface([950, 200])
-        erase.fill(BG)
-        screen.blit(erase, (400, 400))
+        screen.fill(BG, (400, 400, 950, 200))
 
     def init_throw(self):
-        """initialize 8 die objects on the screen"""
+        """initialize 8 die objects on the screen, showing the first roll of the turn"""
         x_midscreen = SCREEN_WIDTH/2
+        values = [FACES[f] for f in expand(self.game.roll())]
         for i in range(1, 9):
             if i < 5:
-                self.throw[f'die{i}'] = Die((x_midscreen - (i*100) + 25, 350))
+                self.throw[f'die{i}'] = Die((x_midscreen - (i*100) + 25, 350), values[i-1])
             else:
-                self.throw[f'die{i}'] = Die((x_midscreen + ((i-5)*100) + 25, 350))
+                self.throw[f'die{i}'] = Die((x_midscreen + ((i-5)*100) + 25, 350), values[i-1])
         for k in self.throw.keys():
             screen.blit(self.throw[k].surf, self.throw[k].rect)
 
@@ -75,6 +107,13 @@ class Throw:
         """:returns the dictionary containing the die objects"""
         return self.throw
 
+    def roll_dice(self):
+        """rolls the dice that are not parked and updates their images on the screen"""
+        values = iter(expand(self.game.roll()))
+        for k in self.throw.keys():
+            if self.throw[k].get_value() != 0:
+                screen.blit(self.throw[k].roll(FACES[next(values)]), self.throw[k].rect)
+
     def check_throw(self):
         """:method used to create a list of dice allowed to chose for the next throw"""
         options = []
@@ -90,169 +129,149 @@ class Throw:
         """
         same_dice = []
         val = self.throw[die].get_value()
+        score = self.game.select_face(FACES.index(val))
         for k in self.throw.keys():
             if self.throw[k].get_value() == val:
                 same_dice.append(k)
-                erase_dies = pygame.Surface([90, 90])
-                erase_dies.fill(BG)
-                screen.blit(erase_dies, self.throw[k].get_position())
+                screen.fill(BG, (self.throw[k].get_position(), (90, 90)))
                 newpos = self.throw[k].rect.move(0, 110)
                 screen.blit(self.throw[k].surf, newpos)  # Move the selected die
         for k in same_dice:
             self.throw[k].set_zero()
-        if val == 'worm':
-            return 5 * len(same_dice)
-        else:
-            return val * len(same_dice)
+        return score
 
 
 class Player:
 
     number = 1
 
-    def __init__(self, name, dominos, textboard):
+    def __init__(self, name, dominos, textboard, index):
         """
         Initializes a Player object
 
         :arg name: name of each player instance
         :arg dominos: a Dominos object containing a dictionary of all the dominos on the table
         :arg textboard: a Textboard object for explaining the player result at the end of the turn on the messageboard
+        :arg index: index of the player in the rules.Game object that holds the dominos and dice of the player
         """
         self.name = name
-        self.dominos = OrderedDict()    # dictionary to store in order the dominos each player possesses
-        self.parked = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0, 'worm': 0}
         self.stenen = dominos           # dictionary of the current dominos available at the table
+        self.game = dominos.game
+        self.index = index
         self.number = Player.number
         self.board = textboard
         Player.number += 1
 
+    @property
+    def dominos(self):
+        """:returns an ordered dictionary of the dominos the player possesses, the last one is the upper domino"""
+        return OrderedDict((d, DOMINO_VALUES[d]) for d in self.game.stacks[self.index])
+
+    @property
+    def parked(self):
+        """:returns a dictionary with the points of the dice parked per die value in the turn of the player"""
+        parked = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0, 'worm': 0}
+        if self.game.current == self.index:
+            turn = self.game.turn
+            for f in turn.chosen():
+                parked[FACES[f]] = POINTS[f] * turn.parked[f]
+        return parked
+
     def get_score(self):
         """:returns the total number of points from the parked dice of the player so far in a turn"""
-        score = sum(self.parked.values())
-        return score
+        if self.game.current != self.index:
+            return 0
+        return self.game.turn.score
 
     def get_worms(self):
         """
         :returns the total score of a player at a certain moment based on the stock of dominos the player possesses
         """
-        worms = sum(self.dominos.values())
-        return worms
+        return self.game.worms(self.index)
 
     def dice_chosen(self):
         """":returns a list of the dice chosen/parked so far"""
         selected_dice = [k for k in self.parked.keys() if self.parked[k] != 0]
         return selected_dice
 
-    def add_domino(self, score, upper_dominos, count, areas):
-        """
-        this method adds the domino to the stack of the current player. In case the domino that matches the turn
-        score is not available anymore, a recursive call to this function is made until a lower available domino
-        is found, which will then instead be added
-
-        :arg score is the score at the end of the turn, on the basis of which a domino can be obtained
-        :arg upper_dominos is a list of the upper dominos of the other players
-        :arg count is used to for recursive call in case the domino is not available but a lower valued domino is
-        :arg areas needs to be passed in to the .take_domino method from the Dominos object and indicates the
-            screen area as coordinates (x,y) of the current player, from a Scoreboard Object
-
-        :returns: None if s domino from the table is added to the players stock,
-        :returns: domino number / score in case the domino number
-        """
-        try:
-            self.dominos[score] = self.stenen.take_domino(score, areas)
-            text = self.name + ' krijgt domino ' + str(score) + ' met waarde ' + str(self.dominos[score])
-            self.board.message(text)
-
-        except KeyError:
-            dominos = [u for u in upper_dominos if u is not None]
-            if count == 0:
-                count += 1
-                for d in dominos:
-                    if d[0] == score:
-                        self.dominos[score] = d[1]
-                        return d[0]
-            # recursive call to function to find next available domino
-            self.add_domino(score-1, upper_dominos, count, areas)
+    def add_domino(self, domino, areas, victim=None):
+        """
+        this method shows the domino the player just obtained on top of the stack of the player
+
+        :arg domino is the domino number the player obtained at the end of the turn
+        :arg areas indicates the screen area as coordinates (x,y) of the current player, from a Scoreboard Object
+        :arg victim is the Player object the domino was stolen from, None if the domino comes from the table
+        """
+        if victim is None:
+            value = self.stenen.take_domino(domino, areas)
+            text = self.name + ' krijgt domino ' + str(domino) + ' met waarde ' + str(value)
+        else:
+            screen.blit(self.stenen.surf[domino], areas)
+            text = self.name + ' heeft domino ' + str(domino) + ' van ' + victim.name + ' afgepakt'
+        self.board.message(text)
 
     def get_upper_domino(self):
         """:returns the upper domino of the stock of dominos of a player, if no upper domino available returns None"""
-        try:
-            upper_domino = list(self.dominos.items())[-1]
-            steen = upper_domino[0]
-            value = upper_domino[1]
-            return steen, value
-        except IndexError:
+        steen = self.game.top(self.index)
+        if steen is None:
             return
+        return steen, DOMINO_VALUES[steen]
 
-    def put_back_domino(self, areas):
+    def show_upper_domino(self, areas):
         """
-        :arg areas indicates the screen area as coordinates (x,y) of the current player, from a Scoreboard Object
+        :arg areas indicates the screen area as coordinates (x,y) of the player, from a Scoreboard Object
 
-        This method returns the upper domino of a player, if he possesses dominos back to the table and updates all
-        screen locations: 1) domino returned on the table, 2) new upper_domino, or blank at the player Scoreboard
+        updates the screen with the upper domino of the player stack, or blank if the player has no dominos
         """
-        try:
+        if self.get_upper_domino() is not None:
             domino, value = self.get_upper_domino()
-            text3 = self.name + ' heeft domino ' + str(domino) + ' teruggelegd'
-            self.board.message(text3)                   # output turn action to messageboard
-            self.stenen.return_domino(domino, value)    # move upper domino to start position
-            self.dominos.__delitem__(domino)            # delete upper domino from self.dominos
-            if not self.dominos:
-                # If there is no domino below, then restore the BG surface color
-                redraw = pygame.Surface([100, 200])
-                redraw.fill(BG)
-                screen.blit(redraw, areas)
-            else:
-                domino, value = self.get_upper_domino()
-                screen.blit(self.stenen.surf[domino], areas)
-        except TypeError:
-            pass
+            screen.blit(self.stenen.surf[domino], areas)
+        else:
+            # If there is no domino below, then restore the BG surface color
+            screen.fill(BG, (areas, (100, 200)))
+
+    def put_back_domino(self, domino, areas):
+        """
+        :arg domino: the domino number the player returned to the table, None if the player had no dominos
+        :arg areas indicates the screen area as coordinates (x,y) of the current player, from a Scoreboard Object
+
+        This method shows the upper domino a player returned back on the table and updates all screen locations:
+        1) domino returned on the table, 2) new upper_domino, or blank at the player Scoreboard
+        """
+        if domino is None:
+            return
+        text3 = self.name + ' heeft domino ' + str(domino) + ' teruggelegd'
+        self.board.message(text3)                   # output turn action to messageboard
+        self.stenen.return_domino(domino)           # move upper domino to start position
+        self.show_upper_domino(areas)
 
     def lost_upper_domino(self, lost_domino, areas):
         """
         :arg lost_domino: is a domino number (int), e.g 24
         :arg areas: indicates the screen area as coordinates (x,y) of the current player, from a Scoreboard Object
 
-        This method updates a player stack of domino's in case the current player can steal a domino from a player
+        This method updates the screen of a player stack of domino's in case the current player stole a domino from
+        the player
         """
-        try:
-            # delete the domino a player just lost from it's stack of dominos
-            self.dominos.__delitem__(lost_domino)
-            # update the screen with the new upper domino of the player stack
-            if self.get_upper_domino() is not None:
-                domino, value = self.get_upper_domino()
-                screen.blit(self.stenen.surf[domino], areas)
-            else:
-                # If there is no domino below, then restore the BG surface color
-                redraw = pygame.Surface([100, 200])
-                redraw.fill(BG)
-                screen.blit(redraw, areas)
-            self.get_worms()
-            return self.name
-        except KeyError:
-            pass
-
-    def reset_turn(self):
-        """reset a players parked dice at the end of a turn"""
-        self.parked = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0, 'worm': 0}
+        self.show_upper_domino(areas)
+        return self.name
 
 
 class Dominos:
-    def __init__(self):
+    def __init__(self, game):
         """
-        intializes a Dominos object by creating a dictionary of all dominos called dominoVals
+        intializes a Dominos object that draws the dominos on the table of a rules.Game object
 
+        :arg game: the rules.Game object holding the dominos on the table
         :arg self.dominoVals: key, value pairs represent the domino number and value (expressed in nr of worms)
         """
-        self.path = PATH + "/images/"
-        self.dominoVals = {21: 1, 22: 1, 23: 1, 24: 1, 25: 2, 26: 2, 27: 2, 28: 2,
-                           29: 3, 30: 3, 31: 3, 32: 3, 33: 4, 34: 4, 35: 4, 36: 4}
-        # self.dominoVals = {21: 1, 22: 2}  # for testing only
+        self.game = game
+        self.dominoVals = game.table
 
         # generate pygame image objects to create dominos on the screen
         self.surf, self.rect = {}, {}
         for k in self.dominoVals.keys():
-            self.surf[k] = pygame.image.load(self.path + f"{k}.png").convert()
+            self.surf[k] = IMAGES.get(DOMINO_IMAGES[k])
             self.rect[k] = self.surf[k].get_rect(topleft=(50 + 100 * (k - 21), 35))
             screen.blit(self.surf[k], self.rect[k])
 
@@ -262,40 +281,34 @@ class Dominos:
 
     def take_domino(self, score, areas):
         """
-        :arg score: integer that is the total value of the parked dice, which corresponde to a certain domino number
+        :arg score: integer that is the domino number a player took from the table
         :arg areas: indicates the screen area as coordinates (x,y) of the current player, from a Scoreboard Object
 
-        :returns the domino value (value in worms) of the taken domino, and at the same time removes the domino
-            key, value pair from the self.dominosVals dictionary
-        TODO:
+        :returns the domino value (value in worms) of the taken domino, and moves the domino on the screen from the
+            table to the scoreboard area of the current player
         """
         # remove the domino image from the table
-        erase_domino = pygame.Surface([100, 200])
-        erase_domino.fill(BG)
-        screen.blit(erase_domino, self.rect[score])
+        screen.fill(BG, (self.rect[score].topleft, (100, 200)))
         # output the domino to the scoreboard area from the current player
         screen.blit(self.surf[score], areas)
-        return self.dominoVals.pop(score)
+        return DOMINO_VALUES[score]
 
-    def return_domino(self, domino, value):
+    def return_domino(self, domino):
         """
         :arg domino: integer with the domino number
-        :arg value: integer with the domino value in worms
 
-        method adds a domino that a player just lost back on the table
+        method shows a domino that a player just lost back on the table
         """
-        if domino:
-            self.dominoVals[domino] = value
-            screen.blit(self.surf[domino], self.rect[domino])
-        else:
-            print('je hebt geen stenen om terug te leggen')
+        screen.blit(self.surf[domino], self.rect[domino])
 
-    def delete_domino(self):
-        """method deletes the highest domino from the table and updates the screen with the backside of the domino"""
-        domino = max(self.dominoVals.keys())
-        backside = pygame.image.load(self.path + "backside.png").convert()
+    def delete_domino(self, domino):
+        """
+        :arg domino: integer with the number of the domino that has been turned over
+
+        method updates the screen with the backside of the domino that is removed from the table
+        """
+        backside = IMAGES.get(BACKSIDE_IMAGE)
         screen.blit(backside, self.rect[domino])
-        self.dominoVals.__delitem__(domino)
 
     def get_lowest_domino(self):
         """:returns the lowest domino value on the table"""
@@ -313,9 +326,13 @@ class Dominos:
         return 'Beschikbare Stenen: ' + str(self.dominoVals)
 
 
-class Button:
+@lru_cache(maxsize=None)
+def get_font(size):
+    """:returns the pygame font object of the game font in a size, looked up once on first use"""
+    return pygame.font.SysFont(FONT, size)
+
 
-    font1 = pygame.font.SysFont('cambria', 25)
+class Button:
 
     def __init__(self, color, x, y, width, height, text=''):
         """
@@ -333,18 +350,18 @@ class Button:
 
     def draw(self, win, outline=True):
         """
-        :arg win: pygame window object where the button is to be placed on
+        :arg win: DirtyScreen object of the pygame window where the button is to be placed on
         :arg outline: boolean that defines whether or not the button has an outline or not
 
         Call this method to draw the button on the screen
         """
         if outline:
-            pygame.draw.rect(win, BLUE, (self.x - 2, self.y - 2, self.width + 4, self.height + 4), 0)
+            win.draw_rect(BLUE, (self.x - 2, self.y - 2, self.width + 4, self.height + 4), 0)
 
-        pygame.draw.rect(win, self.color, (self.x, self.y, self.width, self.height), 0)
+        win.draw_rect(self.color, (self.x, self.y, self.width, self.height), 0)
 
         if self.text != '':
-            text = Button.font1.render(self.text, True, BLACK)
+            text = TEXTS.render(get_font(25), self.text, BLACK)
             win.blit(text, (
             self.x + (self.width / 2 - text.get_width() / 2), self.y + (self.height / 2 - text.get_height() / 2)))
 
@@ -372,9 +389,6 @@ class Button:
 
 class Scoreboard:
 
-    font1 = pygame.font.SysFont('cambria', 35)
-    font2 = pygame.font.SysFont('cambria', 72)
-
     def __init__(self, players):
         """
         :arg players: a list of Player objects
@@ -386,8 +400,7 @@ class Scoreboard:
         """
         self.players = players
         self.coordinates = []
-        self.max_score = 0
-        self.current_leader = None
+        self.labels = [None] * len(players)    # text and background of the label drawn for each player
         self.init_board()
 
     def init_board(self):
@@ -410,29 +423,22 @@ class Scoreboard:
         """
         :arg j: integer that holds the index of the current player in the game loop
 
-        Call this method to highlight the current player and update the players scores
+        Call this method to highlight the current player and update the players scores, only the labels that changed
+        are drawn again
         """
-        erase_score = pygame.Surface([250, 55])
-        erase_score.fill(BG)
         for i in range(len(self.players)):
             score = self.players[i].get_worms()
 
             # Highlight name and score of the current player
-            if i == j:
-                text = Scoreboard.font1.render(self.players[i].name + ': ' + str(score), True, BLACK, RED)
-            else:
-                text = Scoreboard.font1.render(self.players[i].name + ': ' + str(score), True, BLACK, BG)
+            label = (self.players[i].name + ': ' + str(score), RED if i == j else BG)
+            if label == self.labels[i]:
+                continue
+            self.labels[i] = label
+            text = TEXTS.render(get_font(35), label[0], BLACK, label[1])
             coords = (self.coordinates[i][0], self.coordinates[i][1] - 70)
-            screen.blit(erase_score, coords)
+            screen.fill(BG, (coords, (250, 55)))
             screen.blit(text, coords)
 
-            # Keep track of the leader and the leading score for the end_of_game screen
-            if score > self.max_score:
-                self.max_score = score
-                self.current_leader = self.players[i].name
-            elif self.current_leader is None:
-                self.current_leader = 'Niemand'
-
     def end_of_game(self):
         """
         This method is called at after all the dominos have been taken by the players and creates an end screen
@@ -440,10 +446,15 @@ class Scoreboard:
 
         :returns a Button object on the end_of_game screen to start a new game
         """
-        # set-up content for end of game screen
+        # set-up content for end of game screen, all players with the most worms win when it is a tie
         screen.fill(BG)
-        text1 = Scoreboard.font2.render(self.current_leader + " heeft gewonnen!!", True, WHITE)
-        text2 = Scoreboard.font1.render("met een score van: " + str(self.max_score), True, WHITE)
+        winners = [self.players[i] for i in self.players[0].game.winners()]
+        if len(winners) == 1:
+            text1 = get_font(72).render(winners[0].name + " heeft gewonnen!!", True, WHITE)
+        else:
+            names = ', '.join(p.name for p in winners[:-1]) + ' en ' + winners[-1].name
+            text1 = get_font(72).render(names + " hebben gewonnen!!", True, WHITE)
+        text2 = get_font(35).render("met een score van: " + str(winners[0].get_worms()), True, WHITE)
         b_x, b_y = 200, 70
         button = Button(LBLUE, (SCREEN_WIDTH-b_x) / 2, 700, b_x, b_y, 'Nieuw Spel')
 
@@ -461,32 +472,41 @@ class Scoreboard:
 
 class Textboard:
 
-    font1 = pygame.font.SysFont('cambria', 25)
+    def __init__(self):
+        """Initializes a Textboard object, the white message bar at the bottom of the game window"""
+        self.text = None
 
     def message(self, text):
         """Class to create the white TextBoard object to display game actions at the bottom of the game window"""
+        if text == self.text:
+            return
+        self.text = text
 
         # Clear textboard
-        message_area = pygame.Surface([SCREEN_WIDTH, 70])
-        message_area.fill(WHITE)
-        screen.blit(message_area, (0, SCREEN_HEIGHT - 70))
+        screen.fill(WHITE, (0, SCREEN_HEIGHT - 70, SCREEN_WIDTH, 70))
 
         # Output message to textboard
-        text = Textboard.font1.render(text, True, BLACK)
+        text = TEXTS.render(get_font(25), text, BLACK)
         loc = (SCREEN_WIDTH/2 - text.get_width()/2, SCREEN_HEIGHT - 50)
         screen.blit(text, loc)
 
 
-def init_display():
+def init_display(fps=FPS):
     """
     This method is called from the main game loop to initialize the main pygame window. Further it defines a set of
     global variables used to draw and update the main game window and
+
+    :arg fps: the maximum number of frames per second drawn in the game window
     """
 
     # Define constants for the screen width and height
-    global SCREEN_WIDTH, SCREEN_HEIGHT, screen, message_area
+    global SCREEN_WIDTH, SCREEN_HEIGHT, screen, message_area, IMAGES
     global BG, WHITE, BLACK, LBLUE, BLUE, RED
 
+    # only start the parts of pygame the game window uses
+    pygame.display.init()
+    pygame.font.init()
+
     # Set the vars for the window size
     SCREEN_WIDTH = 1700
     SCREEN_HEIGHT = 1000
@@ -499,9 +519,14 @@ def init_display():
     BLUE = pygame.Color('lightcyan3')
     RED = pygame.Color('brown1')  # FF4040
 
-    # set the pygame main window
-    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    # set the pygame main window, only the areas changed since the previous frame are pushed to the display
+    screen = DirtyScreen(pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT)), fps)
     screen.fill(BG)  # Fill the background with background color
+
+    # decode all images once and pack them in one atlas surface
+    if IMAGES is None:
+        names = list(DIE_IMAGES.values()) + list(DOMINO_IMAGES.values()) + [BACKSIDE_IMAGE]
+        IMAGES = ImageAtlas(PATH + "/images/", names)
     message_area = pygame.Surface([SCREEN_WIDTH, 70])
     message_area.fill(WHITE)
 
@@ -521,9 +546,7 @@ def throw_dice(throw, textboard, players, dominos, i, player_areas, turn, one_ro
     dice_taken = False
 
     # if dices left, roll a new die
-    for k in throw.get_throw.keys():
-        if throw.get_throw[k].get_value() != 0:
-            screen.blit(throw.get_throw[k].roll(), throw.get_throw[k].rect)
+    throw.roll_dice()
 
     # counter for selecting the same dice in one throw
     select = False
@@ -535,18 +558,29 @@ def throw_dice(throw, textboard, players, dominos, i, player_areas, turn, one_ro
     if len(options_left) == 0:
         text1 = 'Geen keuzes meer, je verliest je bovenste dominosteen'
         textboard.message(text1)
-        highest_domino_before = dominos.get_highest_domino()
-        players[i].put_back_domino(player_areas[i])
-        highest_domino_after = dominos.get_highest_domino()
-        if highest_domino_before == highest_domino_after:
-            dominos.delete_domino()
+        lose_turn(players, dominos, i, player_areas)
         turn = False
         one_round = False
-        players[i].reset_turn()
 
     return turn, dice_taken, one_round, select
 
 
+def lose_turn(players, dominos, i, player_areas):
+    """
+    :arg players: list containing all instances of Player objects
+    :arg dominos: an instance of a Dominos object
+    :arg i: integer representing index of current player
+    :arg player_areas: a list of coordinates of the scoreboard screen area allocated to each player
+
+    Ends the turn of the current player without a score, the upper domino goes back to the table and the highest
+    domino on the table is turned over
+    """
+    returned, flipped = dominos.game.bust()
+    players[i].put_back_domino(returned, player_areas[i])
+    if flipped is not None:
+        dominos.delete_domino(flipped)
+
+
 def stop_turn(textboard, players, dominos, i, player_areas, steal_options, upper_dominos, min_score, turn, one_round):
     """
     :arg textboard: an instance of a Textboard object
@@ -578,183 +612,365 @@ def stop_turn(textboard, players, dominos, i, player_areas, steal_options, upper
     if 'worm' not in players[i].dice_chosen():
         text2 = 'Je hebt geen worm gegooid, je verliest je bovenste dominosteen'
         textboard.message(text2)
-        players[i].put_back_domino(player_areas[i])
-        dominos.delete_domino()
+        lose_turn(players, dominos, i, player_areas)
         one_round = False
         turn = False
-        players[i].reset_turn()
     else:
-        # add domino to the current player based on the score, returns None if domino comes from the table
-        count = 0
-        stolen_domino = players[i].add_domino(score, upper_dominos, count, player_areas[i])
-        if stolen_domino is not None:
-            for j in range(len(players)):
-                if j != i:
-                    name = players[j].lost_upper_domino(stolen_domino, player_areas[j])
-                    if name:
-                        text3 = players[i].name + ' heeft domino ' + str(score) + ' van ' + name + ' afgepakt'
-            textboard.message(text3)
+        # take the domino matching the score, from the table or from the stack of another player
+        domino, victim = dominos.game.stop()
+        if victim is None:
+            players[i].add_domino(domino, player_areas[i])
+        else:
+            players[victim].lost_upper_domino(domino, player_areas[victim])
+            players[i].add_domino(domino, player_areas[i], players[victim])
         one_round = False
         turn = False
-        players[i].reset_turn()
     return one_round, turn, score
 
 
-def play_game(names, game):
+class GameSession:
+
+    def __init__(self, names, fps=FPS, bots=None, profiler=None, recorder=None, coach=None, seed=None):
+        """
+        Initializes a GameSession object, the state machine that plays consecutive games in one pygame window. Each
+        event (or move of a bot) moves the session between the phases of a turn:
+        - SELECTING: the dice are rolled and the current player has to select a die
+        - ROLLING: a die has been selected, the player can roll the dice left or stop
+        - STOPPED / BUST: the turn has ended with or without a domino, the next turn starts right away
+        - GAME_OVER: all dominos are gone, the end screen with the new game button is shown
+
+        :arg names: list of strings containing the names of the players of the games
+        :arg fps: the maximum number of frames per second drawn in the game window
+        :arg bots: dictionary of player index and bot object (see rules.play_turn) of the players played by the
+            computer, the other players use the mouse and keyboard
+        :arg profiler: profiling.Profiler object that times the turns and frames of the session, None to not profile
+        :arg recorder: records.RecordWriter object the finished games are written to, None to not record the games
+        :arg coach: coach.Coach object that computes the hints shown during the turns of the players using the mouse
+            and keyboard, None to not show hints
+        :arg seed: integer seed, game g of the session rolls the dice of game g of a tournament with this seed. None
+            for new dice every session
+        """
+        self.names = names
+        self.bots = bots if bots is not None else {}
+        self.running = True
+        self.phase = None
+        self.profiler = profiler
+        self.recorder = recorder
+        self.coach = coach
+        self.seed = seed
+        self.hints_shown = False
+        self.games = 0
+        init_display(fps)
+        if profiler is not None:
+            profiler.install(profile_hooks())
+        if coach is not None:
+            # the worker wakes up the game loop when the hints are ready, the loop never waits for them
+            coach.notify = lambda: pygame.event.post(pygame.event.Event(HINTS))
+
+        # only wake up for the events the game reacts to
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed([QUIT, KEYDOWN, MOUSEBUTTONDOWN, VIDEOEXPOSE, HINTS])
+        self.new_game()
+
+    def new_game(self):
+        """Initializes the game rules, dominos, textboard, player objects and buttons of a new game"""
+        screen.fill(BG)
+        rng = DiceStream(game_seed(self.seed, self.games)) if self.seed is not None else None
+        if self.recorder is not None:
+            from records import RecordedGame
+            self.game = RecordedGame(len(self.names), rng, writer=self.recorder, number=self.games)
+        else:
+            self.game = Game(len(self.names), rng)
+        self.games += 1
+        self.dominos = Dominos(self.game)
+        screen.blit(message_area, (0, SCREEN_HEIGHT - 70))
+        self.textboard = Textboard()
+        self.players = []
+        for i in range(len(self.names)):
+            self.players.append(Player(self.names[i], self.dominos, self.textboard, i))
+
+        # Create instance of player scoreboard
+        self.scoreboard = Scoreboard(self.players)
+        self.player_areas = self.scoreboard.get_coords()
+
+        # Create play buttons
+        self.throw_button = Button(LBLUE, 100, 400, 200, 70, 'Dobbelen')
+        self.throw_button.draw(screen, outline=True)
+        self.stop_button = Button(LBLUE, 1400, 400, 200, 70, 'Stop')
+        self.stop_button.draw(screen, outline=True)
+        self.new_game_button = None
+        self.start_turn()
+
+    def start_turn(self):
+        """Starts the turn of the next player with 8 dice, or shows the end screen when no dominos are left"""
+        i = self.game.current
+        # Highlight active player
+        self.scoreboard.current_player(i)
+
+        # Check if there are any dominos left. If not then end the game
+        if self.game.game_over:
+            self.new_game_button = self.scoreboard.end_of_game()
+            self.phase = GAME_OVER
+            if self.profiler is not None:
+                self.profiler.games += 1
+                self.profiler.dump()
+            return
+        self.min_score = self.dominos.get_lowest_domino()
+
+        # create a list with upper_dominos of all other players that can be stolen
+        self.upper_dominos = [self.players[j].get_upper_domino() for j in range(len(self.players)) if j != i]
+        self.steal_options = [ud[0] for ud in self.upper_dominos if ud is not None]
+
+        # Start with 8 dices in the new round
+        self.throw = Throw(self.game)
+        self.phase = SELECTING
+
+    def end_turn(self):
+        """Sets the phase of the turn that just ended and starts the next turn"""
+        player, taken, stolen_from, returned, flipped = self.game.history[-1]
+        self.phase = BUST if taken is None else STOPPED
+        self.start_turn()
+
+    def roll(self):
+        """Rolls the dice that are not parked, the turn is lost when none of the dice can be selected"""
+        turn, dice_taken, one_round, select = throw_dice(self.throw, self.textboard, self.players, self.dominos,
+                                                         self.game.current, self.player_areas, True, True)
+        if one_round:
+            self.phase = SELECTING
+        else:
+            self.end_turn()
+
+    def stop(self):
+        """Stops the turn and takes a domino, if the score of the current player allows it"""
+        one_round, turn, score = stop_turn(self.textboard, self.players, self.dominos, self.game.current,
+                                           self.player_areas, self.steal_options, self.upper_dominos,
+                                           self.min_score, True, True)
+        if not one_round:
+            self.end_turn()
+
+    def select(self, pos):
+        """
+        :arg pos: tuple with the x,y coordinates of a mouse click
+
+        Parks all dice with the same value as the clicked die, if that value has not been parked before
+        """
+        player = self.players[self.game.current]
+        for k in self.throw.get_throw.keys():
+            die = self.throw.get_throw[k]
+            if die.rect.left < pos[0] < die.rect.right and die.rect.top < pos[1] < die.rect.bottom:
+                val = die.get_value()
+                if val != 0 and player.parked[val] == 0:
+                    self.throw.calculate_score(k)
+                    self.phase = ROLLING
+                return
+
+    def bot_to_move(self):
+        """:returns the bot object of the current player if it is a computer player and has to move, otherwise None"""
+        if self.phase in (SELECTING, ROLLING):
+            return self.bots.get(self.game.current)
+        return None
+
+    def bot_move(self):
+        """Lets the bot of the current player make one move: select a die, roll the dice left or stop"""
+        bot = self.bot_to_move()
+        if self.phase == SELECTING:
+            face = bot.choose_face(self.game, self.game.turn.options())
+            for k in self.throw.get_throw.keys():
+                if self.throw.get_throw[k].get_value() == FACES[face]:
+                    self.throw.calculate_score(k)
+                    self.phase = ROLLING
+                    return
+        elif self.game.claim() is not None and (self.game.turn.dice_left == 0 or bot.should_stop(self.game)):
+            self.stop()
+        else:
+            self.roll()
+
+    def update_hints(self):
+        """
+        Asks the coach for the hints of the turn when it changed and draws the hints that have arrived. The hints of
+        the previous state are erased right away, no hints are shown during the turns of computer players
+        """
+        if self.phase in (SELECTING, ROLLING) and self.bot_to_move() is None:
+            if self.coach.request(self.game) and self.hints_shown:
+                screen.fill(BG, HINTS_AREA)
+                self.hints_shown = False
+            hints = self.coach.poll()
+            if hints is not None:
+                self.draw_hints(hints)
+        else:
+            self.coach.cancel()
+            if self.hints_shown and self.phase != GAME_OVER:
+                screen.fill(BG, HINTS_AREA)
+            self.hints_shown = False
+
+    def draw_hints(self, hints):
+        """:arg hints: dictionary of hints computed by coach.hints, drawn to the right of the dice"""
+        if 'faces' in hints:
+            lines = ['Verwachte wormen per keuze:']
+            for face, worms, bust, stop in hints['faces']:
+                line = f'{FACES[face]}: {worms:+.2f}, {bust:.0%} kans op mislukken'
+                lines.append(line + (f', stop: {stop}' if stop is not None else ''))
+        else:
+            lines = [f'Kans op mislukken: {hints["bust"]:.0%}', f'Verwachte wormen bij dobbelen: {hints["roll"]:+.2f}',
+                     f'Stoppen: domino {hints["stop"]}' if hints['stop'] is not None else 'Stoppen: geen domino']
+        screen.fill(BG, HINTS_AREA)
+        font = get_font(18)
+        for i, line in enumerate(lines):
+            screen.blit(font.render(line, True, WHITE), (HINTS_AREA[0], HINTS_AREA[1] + i * font.get_linesize()))
+        self.hints_shown = True
+
+    def handle(self, event):
+        """:arg event: a pygame event, moves the session to the next phase"""
+        if event.type == QUIT or (event.type == KEYDOWN and event.key == K_ESCAPE):
+            self.running = False
+
+        elif event.type == VIDEOEXPOSE:
+            # the window has been uncovered, push the whole window to the display again
+            screen.mark(screen.get_rect())
+
+        elif self.bot_to_move() is not None:
+            # the mouse and keyboard are ignored during the turn of a computer player
+            pass
+
+        elif self.phase == GAME_OVER:
+            # start a new game when the new game button is clicked
+            if event.type == MOUSEBUTTONDOWN and self.new_game_button.isOver(event.pos):
+                self.new_game()
+
+        elif event.type == KEYDOWN:
+            # space for new throw or 's' to stop turn
+            if event.key == K_SPACE and self.phase == ROLLING:
+                self.roll()
+            elif event.key == K_s:
+                self.stop()
+
+        elif event.type == MOUSEBUTTONDOWN:
+            if self.throw_button.isOver(event.pos) and self.phase == ROLLING:
+                self.roll()
+            elif self.stop_button.isOver(event.pos):
+                self.stop()
+            elif self.phase == SELECTING:
+                self.select(event.pos)
+
+    def run(self):
+        """
+        The main game loop, sleeps until an event arrives (or the timeout passes), handles all pending events and
+        pushes the changed areas to the display. A computer player makes a move each time the loop wakes up without
+        events, the shorter BOT_DELAY timeout paces the moves
+        """
+        while self.running:
+            timeout = BOT_DELAY if self.bot_to_move() is not None else EVENT_TIMEOUT
+            events = [pygame.event.wait(timeout)] + pygame.event.get()
+            if self.profiler is not None:
+                self.profiler.wake(events)
+            for event in events:
+                if event.type != NOEVENT:
+                    self.handle(event)
+                if not self.running:
+                    break
+            else:
+                if len(events) == 1 and events[0].type == NOEVENT and self.bot_to_move() is not None:
+                    self.bot_move()
+                if self.coach is not None:
+                    self.update_hints()
+                screen.update()
+                if self.profiler is not None:
+                    self.profiler.frame(screen)
+        for bot in self.bots.values():
+            if hasattr(bot, 'close'):
+                bot.close()
+        if self.profiler is not None:
+            self.profiler.uninstall()
+            self.profiler.dump()
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.coach is not None:
+            self.coach.close()
+        pygame.quit()
+
+
+def profile_hooks():
+    """:returns a list of (object, attribute name, histogram name) of the functions timed by a profiling.Profiler"""
+    module = sys.modules[__name__]
+    return [(Throw, 'init_throw', 'roll'), (Throw, 'roll_dice', 'roll'), (Throw, 'calculate_score', 'select'),
+            (module, 'throw_dice', 'throw'), (module, 'stop_turn', 'stop'), (module, 'lose_turn', 'bust'),
+            (DirtyScreen, 'push', 'redraw')]
+
+
+def play_game(names, game=True, fps=FPS, bots=None, profiler=None, recorder=None, coach=None, seed=None):
     """
     :arg names: list of strings containing the names of the players of the games. Length of the is the nr of players
-    :keyword game: boolean to control the outer game loop
-
-    This function is the main game loop using all classes and helper functions defined in this file. It is called from
-    the game_menu.py file that contains PyQt5 UI's to start the game. At the end of a game, a new game can be started
-    from this function by a recursive call.
+    :keyword game: boolean, run the game loop right away
+    :keyword fps: the maximum number of frames per second drawn in the game window
+    :keyword bots: dictionary of player index and bot object of the players played by the computer
+    :keyword profiler: profiling.Profiler object timing the game, by default one with an overlay when the environment
+        variable REGENWORMEN_PROFILE holds the file name of the statistics
+    :keyword recorder: records.RecordWriter object the finished games are written to
+    :keyword coach: coach.Coach object computing the hints shown to the players using the mouse and keyboard
+    :keyword seed: integer seed of the dice of the games, None for new dice every session
+
+    This function starts the main game loop using all classes and helper functions defined in this file. It is called
+    from the game_menu.py file that contains PyQt5 UI's to start the game. At the end of a game, a new game can be
+    started from the end screen, the session keeps playing games until the window is closed.
     """
-    # Initialize pygame window
-    init_display()
-
-    # Initialize dominos, textboard and player objects
-    dominos = Dominos()
-    screen.blit(message_area, (0, SCREEN_HEIGHT - 70))
-    textboard = Textboard()
-    players = []
-    for i in range(len(names)):
-        players.append(Player(names[i], dominos, textboard))
-
-    # Create instance of player scoreboard
-    scoreboard = Scoreboard(players)
-    player_areas = scoreboard.get_coords()
-
-    # Create play buttons
-    throw_button = Button(LBLUE, 100, 400, 200, 70, 'Dobbelen')
-    throw_button.draw(screen, outline=True)
-    stop_button = Button(LBLUE, 1400, 400, 200, 70, 'Stop')
-    stop_button.draw(screen, outline=True)
-
-    # Main game loop
-    while game:
-
-        # Event loop that handles starting a new game or quit after finishing a game
-        for ev in pygame.event.get():
-
-            # Loop one round of the game over all players
-            for i in range(len(players)):
-                # Highlight active player
-                scoreboard.current_player(i)
-
-                # Check if there are any dominos left. If not then end the game
-                try:
-                    min_score = dominos.get_lowest_domino()
-                except ValueError:
-                    # create a new_game Button object, which will be checked after breaking out of this loop
-                    new_game = scoreboard.end_of_game()
-                    pygame.display.flip()
-                    break
-
-                # create a list with upper_dominos of all other players that can be stolen
-                upper_dominos = [players[j].get_upper_domino() for j in range(len(players)) if j != i]
-                steal_options = [ud[0] for ud in upper_dominos if ud is not None]
-
-                # reset turn booleans to start a new turn for the current player
-                turn = True  # Stops one turn of a player and determines the turn score
-                dice_taken = False  # Ensures rolling new dice can only be done after selecting min of 1 die
-                select = False  # Ensures that only one die is selected per throw and not more
-                one_round = True # Stops one game_round and breaks out of loop to move to next player
-
-                # Start with 8 dices in the new round
-                throw = Throw()
-
-                # Loop that plays one_round for the current player
-                while one_round:
-                    # check keyboard input
-                    for event in pygame.event.get():
-
-                        # check for keydown events escape to exit, space for new throw or 's' to stop turn
-                        if event.type == KEYDOWN:
-                            # Was it the Escape key? If so, stop the loop.
-                            if event.key == K_ESCAPE:
-                                game = False
-                                one_round = False
-                                pygame.quit()
-
-                            # Roll dice that are not parked
-                            elif event.key == K_SPACE and turn and dice_taken:
-                                turn, dice_taken, one_round, select = \
-                                    throw_dice(throw, textboard, players, dominos, i, player_areas, turn, one_round)
-
-                            # user can press 's' to stop the rolling of dice and get score to select domino
-                            elif event.key == K_s:
-                                one_round, turn, score = stop_turn(textboard, players, dominos, i, player_areas,
-                                                                   steal_options, upper_dominos, min_score,
-                                                                   turn, one_round)
-
-                        elif event.type == pygame.MOUSEBUTTONDOWN:
-                            # get the position of the mouse click
-                            x, y = pygame.mouse.get_pos()
-
-                            # get positions of play butttons
-                            throw_xpos = throw_button.get_xpos()
-                            throw_ypos = throw_button.get_ypos()
-                            stop_xpos = stop_button.get_xpos()
-                            stop_ypos = stop_button.get_ypos()
-
-                            # check if throw_button has been clicked
-                            if throw_xpos[0] < x < throw_xpos[1] and turn and dice_taken:
-                                if throw_ypos[0] < y < throw_ypos[1]:
-                                    # Roll dice that are not parked
-                                    turn, dice_taken, one_round, select = \
-                                        throw_dice(throw, textboard, players, dominos, i, player_areas, turn, one_round)
-
-                            # check if stop_button has been clicked
-                            if stop_xpos[0] < x < stop_xpos[1]:
-                                if stop_ypos[0] < y < stop_ypos[1]:
-                                    # take domino and stop current turn
-                                    one_round, turn, score = stop_turn(textboard, players, dominos, i, player_areas,
-                                                                       steal_options, upper_dominos, min_score,
-                                                                       turn, one_round)
-
-                            # check if a die has been clicked and freeze die
-                            for k in throw.get_throw.keys():
-                                # check if a user has clicked on a die
-                                if throw.get_throw[k].rect.left < x < throw.get_throw[k].rect.right:
-                                    if throw.get_throw[k].rect.top < y < throw.get_throw[k].rect.bottom:
-
-                                        # check if selected die is allowed
-                                        val = throw.get_throw[k].get_value()
-                                        try:
-                                            if players[i].parked[val] == 0 and not select:
-                                                # get score based on the chosen dice
-                                                score = throw.calculate_score(k)
-                                                players[i].parked[val] = score
-                                                dice_taken = True
-                                                select = True
-                                        except KeyError:
-                                            pass
-
-                        elif event.type == QUIT:
-                            game = False
-
-                        # Flip the display
-                        pygame.display.flip()
-
-            # Check at the end of a game, whether the players would like to play a new game
-            pos = pygame.mouse.get_pos()
-            if ev.type == MOUSEBUTTONDOWN:
-                if new_game.isOver(pos):
-                    # recursive call to play_game to restart the game
-                    play_game(names, game)
-
-            elif ev.type == QUIT:
-                game = False
-
-            # flip the display
-            pygame.display.flip()
-
-    pygame.quit()
+    if profiler is None and os.environ.get(PROFILE_VARIABLE):
+        profiler = Profiler(os.environ[PROFILE_VARIABLE], overlay=True)
+    session = GameSession(names, fps, bots, profiler, recorder, coach, seed)
+    if game:
+        session.run()
+    return session
 
 
-if __name__ == '__main__':
+def start_menu():
+    """shows the PyQt5 start menu to enter the names of the players, Qt is only loaded when the menu is used"""
+    from PyQt5.QtWidgets import QApplication
+    from game_menu import StartMenu
 
     app = QApplication(sys.argv)
     startmenu = StartMenu(play_game)
     startmenu.show()
-    sys.exit(app.exec_())
+    return app.exec_()
+
+
+def main(argv=None):
+    """command line entry point, starts a game with the players given or shows the start menu without players"""
+    parser = argparse.ArgumentParser(description='Play Regenwormen (Pickomino)')
+    parser.add_argument('players', nargs='*', help="names of the players, 'name=bot' for a computer player with a bot "
+                                                   "name (greedy, solver, mcts, policy) or 'module:Class'")
+    parser.add_argument('--fps', type=int, default=FPS, help='maximum number of frames per second')
+    parser.add_argument('--record', help='append the games to this game record file')
+    parser.add_argument('--profile', help='show the profiling overlay and write the statistics to this JSON file')
+    parser.add_argument('--coach', action='store_true', help='show hints computed in the background during the turns')
+    parser.add_argument('--seed', type=int, default=None, help='roll the dice of the games of a tournament with this '
+                                                                'seed')
+    args = parser.parse_args(argv)
+
+    if not args.players:
+        return start_menu()
+    if len(args.players) > 6:
+        parser.error('a game has at most 6 players')
+
+    names, bots = [], {}
+    for i, player in enumerate(args.players):
+        name, _, bot = player.partition('=')
+        names.append(name)
+        if bot:
+            from tournament import make_bot
+            bots[i] = make_bot(bot)
+    recorder = None
+    if args.record:
+        # records loads numpy, so it is only imported when the games are recorded
+        from records import RecordWriter
+        recorder = RecordWriter(args.record)
+    profiler = Profiler(args.profile, overlay=True) if args.profile else None
+    coach = None
+    if args.coach:
+        # the worker process is started before the window is opened
+        from coach import Coach
+        coach = Coach()
+    play_game(names, fps=args.fps, bots=bots, profiler=profiler, recorder=recorder, coach=coach, seed=args.seed)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,93 @@
+import pygame
+
+from collections import OrderedDict
+
+
+class DirtyScreen:
+
+    max_rects = 64
+
+    def __init__(self, surface, fps=60):
+        """
+        Initializes a DirtyScreen object that wraps the surface of the pygame window and keeps track of the areas
+        changed since the last frame, so only these areas have to be pushed to the display
+
+        :arg surface: the pygame display surface
+        :arg fps: the maximum number of frames per second, 0 for no limit
+        """
+        self.surface = surface
+        self.fps = fps
+        self.dirty = []
+        self.clock = pygame.time.Clock()
+
+    def blit(self, source, dest, area=None):
+        """draws the source surface on the screen like pygame.Surface.blit and marks the changed area"""
+        rect = self.surface.blit(source, dest, area)
+        self.dirty.append(rect)
+        return rect
+
+    def fill(self, color, rect=None):
+        """fills the screen, or the area rect of the screen, with a color and marks the changed area"""
+        rect = self.surface.fill(color, rect)
+        self.dirty.append(rect)
+        return rect
+
+    def draw_rect(self, color, rect, width=0):
+        """draws a rectangle on the screen like pygame.draw.rect and marks the changed area"""
+        rect = pygame.draw.rect(self.surface, color, rect, width)
+        self.dirty.append(rect)
+        return rect
+
+    def mark(self, rect):
+        """marks an area of the screen as changed"""
+        self.dirty.append(pygame.Rect(rect))
+
+    def push(self):
+        """pushes the changed areas to the display"""
+        if self.dirty:
+            if len(self.dirty) > DirtyScreen.max_rects:
+                self.dirty = [self.dirty[0].unionall(self.dirty[1:])]
+            pygame.display.update(self.dirty)
+            self.dirty = []
+
+    def update(self):
+        """pushes the changed areas to the display and waits to keep the frame rate below the fps limit"""
+        self.push()
+        self.clock.tick(self.fps)
+
+    def __getattr__(self, name):
+        """other attributes are taken from the display surface"""
+        return getattr(self.surface, name)
+
+
+class TextCache:
+    def __init__(self, max_size=256):
+        """
+        Initializes a TextCache object that keeps the most recently used rendered texts, so a text drawn again is not
+        rendered again
+
+        :arg max_size: maximum number of text surfaces kept, the least recently used surface is dropped first
+        """
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, color, background=None):
+        """:returns the surface of a text rendered like pygame.font.Font.render with antialiasing"""
+        key = (font, text, tuple(color), None if background is None else tuple(background))
+        surf = self.surfaces.get(key)
+        if surf is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surf
+        self.misses += 1
+        surf = font.render(text, True, color, background)
+        self.surfaces[key] = surf
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+        return surf
+
+    def stats(self):
+        """:returns a dictionary with the number of texts kept and the cache hits and misses"""
+        return {'texts': len(self.surfaces), 'hits': self.hits, 'misses': self.misses}
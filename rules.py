@@ -0,0 +1,340 @@
+import random
+
+from dice import roll, DiceStream
+
+# Faces of a die, a die face is referred to by its index in this tuple (index 5 is the worm)
+FACES = (1, 2, 3, 4, 5, 'worm')
+WORM = 5
+POINTS = (1, 2, 3, 4, 5, 5)
+NUM_DICE = 8
+MAX_SCORE = POINTS[WORM] * NUM_DICE
+
+# key, value pairs represent the domino number and value (expressed in nr of worms)
+DOMINO_VALUES = {21: 1, 22: 1, 23: 1, 24: 1, 25: 2, 26: 2, 27: 2, 28: 2,
+                 29: 3, 30: 3, 31: 3, 32: 3, 33: 4, 34: 4, 35: 4, 36: 4}
+
+# owner of a domino that is not in the stack of a player
+TABLE = -1
+FLIPPED = -2
+
+
+def expand(counts):
+    """:returns a list of face indices, one for each die in the face-count vector counts"""
+    dice = []
+    for face in range(6):
+        dice.extend([face] * counts[face])
+    return dice
+
+
+def lower_table(tiles):
+    """
+    :arg tiles: the domino numbers on the table
+
+    :returns a list with for every turn score from 0 to MAX_SCORE the highest domino on the table not above the score,
+        None when there is none. This resolves the domino taken from the table when stopping with that score
+    """
+    table, best = [], None
+    for score in range(MAX_SCORE + 1):
+        if score in tiles:
+            best = score
+        table.append(best)
+    return table
+
+
+def claim_table(tiles, steals):
+    """
+    :arg tiles: the domino numbers on the table
+    :arg steals: the upper domino numbers of the other players
+
+    :returns a list with for every turn score from 0 to MAX_SCORE the domino obtained when stopping with a worm
+        parked, None when no domino can be taken with that score. This is the resolution of Game.claim for every
+        score at once: the domino on the table with the score, else the upper domino of another player with the
+        score, else the domino of Game.lower
+    """
+    return [score if score in steals else domino for score, domino in enumerate(lower_table(tiles))]
+
+
+class Turn:
+    def __init__(self):
+        """
+        Initializes a Turn object holding the dice state of the turn of one player
+
+        :arg self.parked: number of parked dice per face
+        :arg self.rolled: face-count vector of the last roll, None when the dice need to be rolled again
+        :arg self.rolls: number of rolls in the turn so far
+        """
+        self.dice_left = NUM_DICE
+        self.parked = [0, 0, 0, 0, 0, 0]
+        self.score = 0
+        self.rolled = None
+        self.rolls = 0
+
+    @property
+    def has_worm(self):
+        """:returns True when at least one worm has been parked"""
+        return self.parked[WORM] != 0
+
+    def options(self):
+        """:returns a list of the faces of the last roll that are allowed to be chosen"""
+        if self.rolled is None:
+            return []
+        return [f for f in range(6) if self.rolled[f] and not self.parked[f]]
+
+    def chosen(self):
+        """:returns a list of the faces parked so far"""
+        return [f for f in range(6) if self.parked[f]]
+
+
+class Game:
+    def __init__(self, players, rng=None):
+        """
+        Initializes a Game object that holds the complete state of a game without drawing anything, so games can be
+        simulated without a pygame window
+
+        :arg players: number of players in the game
+        :arg rng: the random generator that rolls the dice: a dice.DiceStream, which rolls roll r of turn t (the number
+            of finished turns in self.history) from its seed, t and r alone, or a random.Random instance, which rolls
+            the dice in the order they are asked. A new random.Random is created when not provided
+        """
+        self.rng = rng if rng is not None else random.Random()
+        self.stream = rng if isinstance(rng, DiceStream) else None
+        self.table = dict(DOMINO_VALUES)            # dominos on the table
+        self.stacks = [[] for _ in range(players)]  # dominos of each player, the last one is the upper domino
+        self.flipped = []                           # dominos turned over and removed from the game
+        # one tuple (player, taken, stolen_from, returned, flipped) per finished turn, None where not applicable
+        self.history = []
+        self.current = 0
+        self.turn = Turn()
+        self.reindex()
+
+    def reindex(self):
+        """
+        Builds the index of the dominos from self.table, self.stacks and self.flipped, it has to be called after
+        changing these directly. The index is kept up to date by stop() and bust():
+        - self.owner: for every score up to MAX_SCORE the player holding the domino with that number, TABLE or
+          FLIPPED, None for the numbers that are not a domino
+        - self.position: for every domino number the position of the domino in the stack of its owner
+        - self.worm_totals: the number of worms of each player
+        - self.lower: the lower_table of the dominos on the table
+        """
+        self.owner = [None] * (MAX_SCORE + 1)
+        self.position = [0] * (MAX_SCORE + 1)
+        for d in self.table:
+            self.owner[d] = TABLE
+        for d in self.flipped:
+            self.owner[d] = FLIPPED
+        for j, stack in enumerate(self.stacks):
+            for pos, d in enumerate(stack):
+                self.owner[d] = j
+                self.position[d] = pos
+        self.worm_totals = [sum(DOMINO_VALUES[d] for d in stack) for stack in self.stacks]
+        self.lower = lower_table(self.table)
+
+    def remove_from_table(self, domino, owner):
+        """
+        :arg domino: domino number on the table
+        :arg owner: the player that takes the domino, or FLIPPED
+
+        Removes a domino from the table, the scores that resolved to it now resolve to the next lower domino
+        """
+        del self.table[domino]
+        self.owner[domino] = owner
+        below = self.lower[domino - 1]
+        score = domino
+        while score <= MAX_SCORE and self.lower[score] == domino:
+            self.lower[score] = below
+            score += 1
+
+    def return_to_table(self, domino):
+        """:arg domino: domino number put back on the table, from then on it is the domino of the scores up from it"""
+        self.table[domino] = DOMINO_VALUES[domino]
+        self.owner[domino] = TABLE
+        score = domino
+        while score <= MAX_SCORE and (self.lower[score] is None or self.lower[score] < domino):
+            self.lower[score] = domino
+            score += 1
+
+    @property
+    def game_over(self):
+        """:returns True when there are no dominos left on the table"""
+        return not self.table
+
+    def top(self, player):
+        """:returns the upper domino of a player, or None if the player has no dominos"""
+        stack = self.stacks[player]
+        return stack[-1] if stack else None
+
+    def worms(self, player):
+        """:returns the total number of worms of a player"""
+        return self.worm_totals[player]
+
+    def upper_owner(self, domino):
+        """:returns the player with domino as upper domino, or None when it is not the upper domino of a player"""
+        j = self.owner[domino]
+        if j is not None and j >= 0 and self.position[domino] == len(self.stacks[j]) - 1:
+            return j
+        return None
+
+    def winners(self):
+        """:returns a list of the players with the most worms, more than one when the game is a tie"""
+        worms = [self.worms(p) for p in range(len(self.stacks))]
+        return [p for p in range(len(worms)) if worms[p] == max(worms)]
+
+    def roll(self):
+        """
+        Rolls the dice that are not parked yet
+
+        :returns the face-count vector of the roll. When turn.options() is empty after rolling, the turn is lost and
+            bust() must be called
+        """
+        turn = self.turn
+        if self.stream is not None:
+            turn.rolled = self.stream.roll(turn.dice_left, len(self.history), turn.rolls)
+        else:
+            turn.rolled = roll(turn.dice_left, self.rng)
+        turn.rolls += 1
+        return turn.rolled
+
+    def select_face(self, face):
+        """
+        :arg face: index of the face the current player parks from the last roll
+
+        :returns the points added to the turn score
+        """
+        turn = self.turn
+        if turn.rolled is None or not turn.rolled[face] or turn.parked[face]:
+            raise ValueError(f'face {FACES[face]} can not be chosen')
+        n = turn.rolled[face]
+        turn.parked[face] = n
+        turn.dice_left -= n
+        turn.score += POINTS[face] * n
+        turn.rolled = None
+        return POINTS[face] * n
+
+    def claim(self):
+        """
+        :returns a tuple (domino, victim) of the domino the current player gets when stopping now, victim is the index
+            of the player the domino is stolen from or None if the domino comes from the table. Returns None when
+            stopping is not allowed
+        """
+        turn = self.turn
+        if not turn.has_worm:
+            return None
+        score = turn.score
+        domino = self.lower[score]
+        if domino == score:
+            return score, None
+        j = self.upper_owner(score)
+        if j is not None and j != self.current:
+            return score, j
+        if domino is not None:
+            return domino, None
+        return None
+
+    def stop(self):
+        """
+        Ends the turn of the current player by taking the domino from claim()
+
+        :returns the tuple (domino, victim) from claim(), or None if stopping is not allowed (the turn continues)
+        """
+        result = self.claim()
+        if result is None:
+            return None
+        domino, victim = result
+        if victim is None:
+            self.remove_from_table(domino, self.current)
+        else:
+            self.stacks[victim].pop()
+            self.worm_totals[victim] -= DOMINO_VALUES[domino]
+            self.owner[domino] = self.current
+        stack = self.stacks[self.current]
+        self.position[domino] = len(stack)
+        self.worm_totals[self.current] += DOMINO_VALUES[domino]
+        stack.append(domino)
+        self.history.append((self.current, domino, victim, None, None))
+        self.next_turn()
+        return result
+
+    def bust(self):
+        """
+        Ends the turn of the current player without a score: the upper domino of the player goes back to the table and
+        the highest domino on the table is turned over, unless that is the domino just returned
+
+        :returns a tuple (returned, flipped) of domino numbers, both can be None
+        """
+        stack = self.stacks[self.current]
+        returned = stack.pop() if stack else None
+        if returned is not None:
+            self.return_to_table(returned)
+            self.worm_totals[self.current] -= DOMINO_VALUES[returned]
+        flipped = None
+        if self.table:
+            highest = self.lower[MAX_SCORE]
+            if highest != returned:
+                self.remove_from_table(highest, FLIPPED)
+                self.flipped.append(highest)
+                flipped = highest
+        self.history.append((self.current, None, None, returned, flipped))
+        self.next_turn()
+        return returned, flipped
+
+    def next_turn(self):
+        """moves the game to a new turn of the next player"""
+        self.current = (self.current + 1) % len(self.stacks)
+        self.turn = Turn()
+
+
+class GreedyBot:
+    """Bot that parks the face worth the most points and stops as soon as a domino can be taken"""
+
+    def choose_face(self, game, options):
+        """:returns the face to park from the list of options"""
+        rolled = game.turn.rolled
+        best, best_points = options[0], -1
+        for f in options:
+            if POINTS[f] * rolled[f] >= best_points:
+                best, best_points = f, POINTS[f] * rolled[f]
+        return best
+
+    def should_stop(self, game):
+        """:returns True to stop the turn, only called when stopping is allowed"""
+        return True
+
+
+def play_turn(game, bot):
+    """
+    :arg game: a Game object
+    :arg bot: an object with the methods choose_face(game, options) and should_stop(game)
+
+    Plays one turn of the current player
+
+    :returns the tuple (domino, victim) when the turn ends by stopping, None when the turn is lost
+    """
+    while True:
+        game.roll()
+        options = game.turn.options()
+        if not options:
+            game.bust()
+            return None
+        game.select_face(bot.choose_face(game, options))
+        if game.claim() is not None and (game.turn.dice_left == 0 or bot.should_stop(game)):
+            return game.stop()
+        if game.turn.dice_left == 0:
+            game.bust()
+            return None
+
+
+def simulate_game(bots, rng=None, cls=Game, **kwargs):
+    """
+    :arg bots: list with a bot object for each player
+    :arg rng: a dice.DiceStream or random.Random instance that rolls the dice, see Game
+    :arg cls: the class of the game object, Game or a subclass, created with the keyword arguments kwargs
+
+    Plays a complete game without a window
+
+    :returns the finished Game object
+    """
+    game = cls(len(bots), rng, **kwargs)
+    while not game.game_over:
+        play_turn(game, bots[game.current])
+    return game
@@ -0,0 +1,490 @@
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+
+from rules import Game, GreedyBot
+from state import MAX_PLAYERS
+
+# number of messages waiting to be sent to a connection before it counts as too slow and is disconnected
+MAX_PENDING = 1000
+
+# Messages are JSON objects, one per line. A client sends:
+# - {"type": "join", "table": name, "players": n, "name": player name}, the table is created with n seats when it does
+#   not exist yet, the game starts when all seats are taken. A connection has one seat at a table
+# - {"type": "select", "table": name, "face": face index}, {"type": "roll", "table": name},
+#   {"type": "stop", "table": name}, the moves of the current player
+# - {"type": "state", "table": name}, asks for the complete state of the table
+# The server sends {"type": "joined", "table", "seat"}, {"type": "start", "table", "names"},
+# {"type": "update", "table", "events"} with the list of changes since the previous update, {"type": "state", ...}
+# and {"type": "error", "message"}. Events have a "kind": turn, roll, select, take, bust, left or end.
+# A connection that closes frees its seat at a table that has not started, at a table that is playing its seat is
+# played by a rules.GreedyBot from then on (event left), so the game of the other players goes on. A table is removed
+# when its game is over or all its players have left
+
+
+class Table:
+    def __init__(self, name, players, rng):
+        """
+        Initializes a Table object that plays one game with the rules of rules.Game for the connections in its seats.
+        The start of each turn and a roll without a face to choose are handled by the table, the players only send
+        select, roll and stop
+
+        :arg name: name of the table
+        :arg players: number of seats
+        :arg rng: a random.Random instance that rolls the dice of the table
+        """
+        self.name = name
+        self.rng = rng
+        self.seats = [None] * players
+        self.names = [None] * players
+        self.game = None
+        self.events = []
+        self.bot = GreedyBot()  # plays the seats left during the game
+
+    def join(self, connection, name=None):
+        """:returns the seat given to the connection, None when the table is full"""
+        for seat in range(len(self.seats)):
+            if self.seats[seat] is None:
+                self.seats[seat] = connection
+                self.names[seat] = name if name is not None else f'Speler {seat + 1}'
+                return seat
+        return None
+
+    def leave(self, seat):
+        """frees the seat of a connection that closed, during the game the seat is played by self.bot from then on"""
+        self.seats[seat] = None
+        if self.game is None:
+            self.names[seat] = None
+        elif not self.empty and not self.game.game_over:
+            self.events.append({'kind': 'left', 'player': seat})
+            self.play_left()
+
+    @property
+    def full(self):
+        return None not in self.seats
+
+    @property
+    def empty(self):
+        return self.seats.count(None) == len(self.seats)
+
+    def start(self):
+        """starts the game"""
+        self.game = Game(len(self.seats), self.rng)
+        self.broadcast({'type': 'start', 'table': self.name, 'names': self.names})
+        self.start_turn()
+
+    def start_turn(self):
+        """rolls the dice for the next player, or ends the game"""
+        game = self.game
+        if game.game_over:
+            self.events.append({'kind': 'end', 'worms': [game.worms(p) for p in range(len(self.seats))],
+                                'winners': game.winners()})
+            return
+        self.events.append({'kind': 'turn', 'player': game.current})
+        self.roll()
+
+    def roll(self):
+        """rolls the dice left, the turn is lost when no face can be chosen"""
+        game = self.game
+        rolled = game.roll()
+        self.events.append({'kind': 'roll', 'player': game.current, 'rolled': list(rolled)})
+        if not game.turn.options():
+            self.bust()
+
+    def select(self, face):
+        """parks a face, the turn ends when no dice are left"""
+        game = self.game
+        player = game.current
+        game.select_face(face)
+        self.events.append({'kind': 'select', 'player': player, 'face': face, 'score': game.turn.score})
+        if game.turn.dice_left == 0:
+            if game.claim() is not None:
+                self.stop()
+            else:
+                self.bust()
+
+    def stop(self):
+        """ends the turn with a domino"""
+        game = self.game
+        player = game.current
+        result = game.stop()
+        if result is None:
+            raise ValueError('stopping is not allowed')
+        self.events.append({'kind': 'take', 'player': player, 'domino': result[0], 'victim': result[1]})
+        self.start_turn()
+
+    def bust(self):
+        """ends the turn without a domino"""
+        game = self.game
+        player = game.current
+        returned, flipped = game.bust()
+        self.events.append({'kind': 'bust', 'player': player, 'returned': returned, 'flipped': flipped})
+        self.start_turn()
+
+    def play_left(self):
+        """plays the moves of the seats that have been left until it is the turn of a connection or the game is over"""
+        game = self.game
+        while not game.game_over and self.seats[game.current] is None:
+            turn = game.turn
+            if turn.rolled is not None:
+                self.select(self.bot.choose_face(game, turn.options()))
+            elif game.claim() is not None and self.bot.should_stop(game):
+                self.stop()
+            else:
+                self.roll()
+
+    def move(self, seat, message):
+        """
+        :arg seat: seat of the connection that sent the move
+        :arg message: a select, roll or stop message
+
+        Plays a move of the current player, raises ValueError for a move that is not allowed
+        """
+        game = self.game
+        if game is None or game.game_over:
+            raise ValueError('the game is not being played')
+        if seat != game.current:
+            raise ValueError('it is not your turn')
+        rolled = game.turn.rolled is not None
+        if message['type'] == 'select' and rolled:
+            face = message.get('face')
+            # bool is an int in Python, and a negative index would park the worm
+            if isinstance(face, bool) or not isinstance(face, int) or not 0 <= face < 6:
+                raise ValueError('face has to be a face index from 0 to 5')
+            self.select(face)
+        elif message['type'] == 'roll' and not rolled:
+            self.roll()
+        elif message['type'] == 'stop' and not rolled:
+            self.stop()
+        else:
+            raise ValueError(f'{message["type"]} is not allowed now, a face has {"" if rolled else "not "}to be selected')
+        self.play_left()
+
+    def snapshot(self):
+        """:returns a state message with the complete state of the table"""
+        message = {'type': 'state', 'table': self.name, 'names': self.names}
+        game = self.game
+        if game is not None:
+            turn = game.turn
+            message.update(dominos=sorted(game.table), stacks=game.stacks, flipped=game.flipped, current=game.current,
+                           parked=turn.parked, score=turn.score, dice_left=turn.dice_left,
+                           rolled=None if turn.rolled is None else list(turn.rolled))
+        return message
+
+    def broadcast(self, message):
+        """sends a message to all seats, the message is encoded once"""
+        line = json.dumps(message) + '\n'
+        for connection in self.seats:
+            if connection is not None:
+                connection.send_line(line)
+
+    def flush(self):
+        """sends the events since the previous flush as one update message to all seats"""
+        if self.events:
+            self.broadcast({'type': 'update', 'table': self.name, 'events': self.events})
+            self.events = []
+
+
+class Connection:
+    def __init__(self, reader, writer):
+        """
+        Initializes a Connection object of one client. Messages are queued and written by a separate task, so the
+        messages queued while the server handles a batch of moves are written at once. A client that does not read
+        its messages fast enough is disconnected when MAX_PENDING messages are waiting
+
+        :arg reader, writer: the asyncio streams of the connection
+        """
+        self.reader = reader
+        self.writer = writer
+        self.outbox = []
+        self.ready = asyncio.Event()
+        self.open = True
+        self.tables = {}    # seat by table name
+        self.sent = 0
+
+    def send(self, message):
+        """queues a message"""
+        self.send_line(json.dumps(message) + '\n')
+
+    def send_line(self, line):
+        """queues an encoded message"""
+        if not self.open:
+            return
+        if len(self.outbox) >= MAX_PENDING:
+            self.close()
+            return
+        self.outbox.append(line)
+        self.ready.set()
+
+    async def write_loop(self):
+        """writes the queued messages, waiting for the client when its network buffer is full"""
+        try:
+            while self.open:
+                await self.ready.wait()
+                self.ready.clear()
+                data, self.outbox = ''.join(self.outbox), []
+                self.sent += data.count('\n')
+                self.writer.write(data.encode())
+                await self.writer.drain()
+        except ConnectionError:
+            self.open = False
+
+    def close(self):
+        self.open = False
+        self.ready.set()
+        self.writer.close()
+
+
+class Server:
+    def __init__(self, seed=None):
+        """
+        Initializes a Server object that hosts any number of tables in one process
+
+        :arg seed: seed of the dice of the tables, every table gets its own random generator
+        """
+        self.seed = seed
+        self.tables = {}
+        self.connections = set()
+        self.moves = 0
+        self.sent = 0
+
+    def table(self, name, players):
+        """:returns the table with the name, created with a number of seats when it does not exist"""
+        if name not in self.tables:
+            if not 2 <= players <= MAX_PLAYERS:
+                raise ValueError(f'a table has 2 to {MAX_PLAYERS} seats')
+            rng = random.Random(f'{self.seed}:{name}') if self.seed is not None else random.Random()
+            self.tables[name] = Table(name, players, rng)
+        return self.tables[name]
+
+    def remove_table(self, name):
+        """removes a table and the seats the connections have at it"""
+        table = self.tables.pop(name)
+        for connection in table.seats:
+            if connection is not None:
+                connection.tables.pop(name, None)
+
+    def leave(self, connection):
+        """frees the seats of a connection that closed"""
+        for name, seat in connection.tables.items():
+            table = self.tables[name]
+            table.leave(seat)
+            table.flush()
+            if table.empty or table.game is not None and table.game.game_over:
+                self.remove_table(name)
+        connection.tables.clear()
+
+    def handle(self, connection, message):
+        """handles one message of a connection, raises ValueError for a message that is not allowed"""
+        if not isinstance(message, dict):
+            raise ValueError('a message has to be a JSON object')
+        kind = message.get('type')
+        name = message.get('table')
+        if not isinstance(name, str):
+            raise ValueError('a message needs the name of a table')
+        if kind == 'join':
+            player = message.get('name')
+            if player is not None and not isinstance(player, str):
+                raise ValueError('the name of a player has to be a string')
+            if name in connection.tables:
+                raise ValueError(f'you are already at table {name}')
+            table = self.table(name, int(message.get('players', 2)))
+            if table.game is not None:
+                raise ValueError(f'the game at table {name} has started')
+            seat = table.join(connection, player)
+            if seat is None:
+                raise ValueError(f'table {name} is full')
+            connection.tables[name] = seat
+            connection.send({'type': 'joined', 'table': name, 'seat': seat})
+            if table.full:
+                table.start()
+        elif kind == 'state':
+            if name not in self.tables:
+                raise ValueError(f'table {name} does not exist')
+            connection.send(self.tables[name].snapshot())
+        elif kind in ('select', 'roll', 'stop'):
+            if name not in connection.tables:
+                raise ValueError(f'you are not at table {name}')
+            self.tables[name].move(connection.tables[name], message)
+            self.moves += 1
+        else:
+            raise ValueError(f'unknown message type {kind}')
+        if name in self.tables:
+            table = self.tables[name]
+            table.flush()
+            if table.game is not None and table.game.game_over:
+                self.remove_table(name)
+
+    async def serve_client(self, reader, writer):
+        """reads and handles the messages of one client until it disconnects"""
+        connection = Connection(reader, writer)
+        self.connections.add(connection)
+        writing = asyncio.ensure_future(connection.write_loop())
+        try:
+            while connection.open:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    self.handle(connection, json.loads(line))
+                except (ValueError, KeyError, TypeError) as e:
+                    connection.send({'type': 'error', 'message': str(e)})
+        except ConnectionError:
+            pass
+        finally:
+            self.leave(connection)
+            self.connections.discard(connection)
+            connection.open = False
+            connection.ready.set()
+            await writing
+            self.sent += connection.sent
+            writer.close()
+
+    async def start(self, host='127.0.0.1', port=8765):
+        """:returns the asyncio server listening on host and port"""
+        return await asyncio.start_server(self.serve_client, host, port)
+
+
+def apply_event(game, event):
+    """
+    Updates a copy of the game of a table with an event of the server, with the same rules.Game code as the server
+
+    :arg game: the rules.Game object of the copy
+    :arg event: an event of an update message
+
+    :returns False when the copy of the game took another domino than the server, otherwise True
+    """
+    kind = event['kind']
+    if kind == 'roll':
+        game.turn.rolled = tuple(event['rolled'])
+    elif kind == 'select':
+        game.select_face(event['face'])
+    elif kind == 'take':
+        return game.stop() == (event['domino'], event['victim'])
+    elif kind == 'bust':
+        return game.bust() == (event['returned'], event['flipped'])
+    return True
+
+
+class BotClient:
+    def __init__(self, table, players, name, bot=None):
+        """
+        Initializes a BotClient object that plays at a table of a Server with a bot. It keeps a copy of the game that
+        it updates with the events of the server, using the same rules.Game code
+
+        :arg table: name of the table
+        :arg players: number of seats of the table
+        :arg name: player name
+        :arg bot: bot object (see rules.play_turn), a rules.GreedyBot by default
+        """
+        self.table = table
+        self.players = players
+        self.name = name
+        self.bot = bot if bot is not None else GreedyBot()
+        self.game = None
+        self.seat = None
+        self.result = None
+        self.errors = []
+
+    def apply(self, event):
+        """updates the copy of the game with an event of the server"""
+        if event['kind'] == 'end':
+            self.result = event
+        elif not apply_event(self.game, event):
+            raise ValueError(f'copy of the game at table {self.table} differs from the server')
+
+    def decide(self):
+        """:returns the move message of the bot when it is its turn, otherwise None"""
+        game = self.game
+        if game is None or game.game_over or game.current != self.seat:
+            return None
+        turn = game.turn
+        if turn.rolled is not None:
+            return {'type': 'select', 'table': self.table, 'face': self.bot.choose_face(game, turn.options())}
+        if game.claim() is not None and self.bot.should_stop(game):
+            return {'type': 'stop', 'table': self.table}
+        return {'type': 'roll', 'table': self.table}
+
+    async def run(self, host, port):
+        """joins the table and plays until the game is over"""
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write((json.dumps({'type': 'join', 'table': self.table, 'players': self.players,
+                                  'name': self.name}) + '\n').encode())
+        while self.result is None:
+            line = await reader.readline()
+            if not line:
+                break
+            message = json.loads(line)
+            if message['type'] == 'joined':
+                self.seat = message['seat']
+            elif message['type'] == 'start':
+                self.game = Game(len(message['names']))
+            elif message['type'] == 'error':
+                self.errors.append(message['message'])
+            elif message['type'] == 'update':
+                for event in message['events']:
+                    self.apply(event)
+                # every update changes the game, so a decision is sent once for each position
+                move = self.decide()
+                if move is not None:
+                    writer.write((json.dumps(move) + '\n').encode())
+                    await writer.drain()
+        writer.close()
+        return self.result
+
+
+async def run_test(tables=100, players=3, seed=0, host='127.0.0.1'):
+    """
+    Starts a server on a free port of host and plays games at a number of tables with in-process bot clients
+
+    :returns a dictionary with the number of games, moves and messages and the seconds it took
+    """
+    server = Server(seed)
+    listener = await server.start(host, 0)
+    port = listener.sockets[0].getsockname()[1]
+    clients = [BotClient(f'table{t}', players, f'bot{p}') for t in range(tables) for p in range(players)]
+    start = time.perf_counter()
+    results = await asyncio.gather(*(c.run(host, port) for c in clients))
+    seconds = time.perf_counter() - start
+    while server.connections:
+        await asyncio.sleep(0.01)
+    listener.close()
+    await listener.wait_closed()
+    for client in clients:
+        worms = [client.game.worms(p) for p in range(players)]
+        if client.result is None or worms != client.result['worms']:
+            raise RuntimeError(f'client {client.name} at {client.table} did not finish its game like the server')
+    return {'games': tables, 'finished': sum(r is not None for r in results) // players, 'moves': server.moves,
+            'messages': server.sent, 'errors': sum(len(c.errors) for c in clients), 'seconds': seconds}
+
+
+def main(argv=None):
+    """command line entry point, runs the server or the localhost test"""
+    parser = argparse.ArgumentParser(description='Regenwormen game server hosting many tables')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--test', action='store_true', help='play games with bot clients on localhost and exit')
+    parser.add_argument('--tables', type=int, default=100, help='number of tables in the test')
+    parser.add_argument('--players', type=int, default=3, help='number of players per table in the test')
+    args = parser.parse_args(argv)
+
+    if args.test:
+        result = asyncio.run(run_test(args.tables, args.players, args.seed or 0, args.host))
+        print(f'{result["finished"]} of {result["games"]} games, {result["moves"]} moves and {result["messages"]} '
+              f'messages sent in {result["seconds"]:.2f} s, {result["moves"] / result["seconds"]:.0f} moves/s, '
+              f'{result["errors"]} errors')
+        return
+
+    async def serve():
+        listener = await Server(args.seed).start(args.host, args.port)
+        async with listener:
+            await listener.serve_forever()
+    asyncio.run(serve())
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
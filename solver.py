@@ -0,0 +1,151 @@
+from collections import OrderedDict
+
+from dice import marginal
+from rules import POINTS, WORM, DOMINO_VALUES, claim_table
+
+WORM_BIT = 1 << WORM
+
+
+def parked_mask(parked):
+    """:returns a bitmask of the faces parked, from a list with the number of parked dice per face"""
+    mask = 0
+    for f in range(6):
+        if parked[f]:
+            mask |= 1 << f
+    return mask
+
+
+class TurnValues:
+    def __init__(self, tiles, steals, own_top):
+        """
+        Initializes the memoized value table of a turn for one configuration of the dominos, values are expressed in
+        worms won (or lost) by the current player at the end of the turn
+
+        :arg tiles: the domino numbers on the table
+        :arg steals: the upper domino numbers of the other players
+        :arg own_top: the upper domino number of the current player, lost when the turn fails, or None
+        """
+        self.bust = -DOMINO_VALUES[own_top] if own_top is not None else 0
+        # worms won when stopping with a worm parked, per score, None when no domino can be taken
+        self.reward = [DOMINO_VALUES[d] if d is not None else None for d in claim_table(tiles, steals)]
+        self.memo = {}
+
+    def stop_value(self, mask, score):
+        """:returns the worms won when stopping now, or None when stopping is not allowed"""
+        if not mask & WORM_BIT:
+            return None
+        return self.reward[score]
+
+    def value(self, mask, score, dice_left):
+        """
+        :arg mask: bitmask of the faces parked so far
+        :arg score: the turn score of the parked dice
+        :arg dice_left: number of dice that are not parked
+
+        :returns the expected worms of the best play after choosing a face, choosing between stopping and rolling
+        """
+        key = (mask << 6 | score) << 4 | dice_left
+        v = self.memo.get(key)
+        if v is None:
+            v = self.roll_value(mask, score, dice_left)
+            stop = self.stop_value(mask, score)
+            if stop is not None and stop > v:
+                v = stop
+            self.memo[key] = v
+        return v
+
+    def roll_value(self, mask, score, dice_left):
+        """:returns the expected worms when rolling the dice that are left and playing the best moves after that"""
+        bust = self.bust
+        faces = [f for f in range(6) if not mask >> f & 1]
+        if dice_left == 0 or not faces:
+            return bust
+
+        # values after parking c dice of face f, per face that can still be chosen
+        children = []
+        for f in faces:
+            row = [bust]
+            for c in range(1, dice_left + 1):
+                row.append(self.value(mask | 1 << f, score + POINTS[f] * c, dice_left - c))
+            children.append(row)
+
+        expected = 0.0
+        for p, counts in marginal(dice_left, len(faces)):
+            best = bust
+            for i, c in enumerate(counts):
+                if c and children[i][c] > best:
+                    best = children[i][c]
+            expected += p * best
+        return expected
+
+    def best_face(self, mask, score, rolled):
+        """
+        :arg rolled: face-count vector of the last roll
+
+        :returns a tuple (face, value) of the face to park with the best expected worms, face is None when busted
+        """
+        dice_left = sum(rolled)
+        best, best_value = None, self.bust
+        for f in range(6):
+            c = rolled[f]
+            if c and not mask >> f & 1:
+                v = self.value(mask | 1 << f, score + POINTS[f] * c, dice_left - c)
+                if best is None or v > best_value:
+                    best, best_value = f, v
+        return best, best_value
+
+    def should_stop(self, mask, score, dice_left):
+        """:returns True when stopping is allowed and worth at least as much as rolling again"""
+        stop = self.stop_value(mask, score)
+        return stop is not None and stop >= self.roll_value(mask, score, dice_left)
+
+
+class TurnSolver:
+    def __init__(self, max_tables=256):
+        """
+        Initializes a TurnSolver object that finds the moves with the highest expected worms in a single turn
+
+        :arg max_tables: number of domino configurations kept in the cache, the least recently used one is evicted
+        """
+        self.max_tables = max_tables
+        self.tables = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def values(self, tiles, steals, own_top):
+        """:returns the TurnValues object of a domino configuration, see TurnValues for the arguments"""
+        key = (frozenset(tiles), frozenset(steals), own_top)
+        values = self.tables.get(key)
+        if values is not None:
+            self.hits += 1
+            self.tables.move_to_end(key)
+            return values
+        self.misses += 1
+        values = TurnValues(tiles, steals, own_top)
+        self.tables[key] = values
+        if len(self.tables) > self.max_tables:
+            self.tables.popitem(last=False)
+        return values
+
+    def game_values(self, game):
+        """:returns the TurnValues object for the current player of a rules.Game object"""
+        steals = [game.top(j) for j in range(len(game.stacks)) if j != game.current]
+        return self.values(game.table, [s for s in steals if s is not None], game.top(game.current))
+
+
+class SolverBot:
+    """Bot that plays the moves with the highest expected worms of the current turn, using a TurnSolver"""
+
+    def __init__(self, solver=None):
+        self.solver = solver if solver is not None else TurnSolver()
+
+    def choose_face(self, game, options):
+        """:returns the face to park from the list of options"""
+        turn = game.turn
+        face, value = self.solver.game_values(game).best_face(parked_mask(turn.parked), turn.score, turn.rolled)
+        return face
+
+    def should_stop(self, game):
+        """:returns True to stop the turn, only called when stopping is allowed"""
+        turn = game.turn
+        return self.solver.game_values(game).should_stop(parked_mask(turn.parked), turn.score, turn.dice_left)
@@ -0,0 +1,183 @@
+import random
+
+from rules import NUM_DICE, MAX_SCORE, DOMINO_VALUES, Game
+
+FIRST_DOMINO = min(DOMINO_VALUES)
+MAX_PLAYERS = 6
+
+# Bit layout of an encoded position, bits 0-15 hold the dominos on the table. The stacks of the players follow after
+# the fixed fields: per player the number of dominos (5 bits) and the dominos from bottom to top (4 bits, domino - 21)
+PARKED_SHIFT = 16   # 6 bits, the parked faces
+SCORE_SHIFT = 22    # 6 bits, the turn score
+DICE_SHIFT = 28     # 4 bits, the dice left
+CURRENT_SHIFT = 32  # 3 bits, the current player
+PLAYERS_SHIFT = 35  # 3 bits, the number of players
+STACKS_SHIFT = 38
+
+
+def encode(game):
+    """:returns a rules.Game position packed in an integer, equal positions always give the same integer"""
+    code = 0
+    for d in game.table:
+        code |= 1 << (d - FIRST_DOMINO)
+    turn = game.turn
+    for f in range(6):
+        if turn.parked[f]:
+            code |= 1 << (PARKED_SHIFT + f)
+    code |= turn.score << SCORE_SHIFT | turn.dice_left << DICE_SHIFT
+    code |= game.current << CURRENT_SHIFT | len(game.stacks) << PLAYERS_SHIFT
+    shift = STACKS_SHIFT
+    for stack in game.stacks:
+        code |= len(stack) << shift
+        shift += 5
+        for d in stack:
+            code |= (d - FIRST_DOMINO) << shift
+            shift += 4
+    return code
+
+
+def decode(code, cls=Game, rng=None):
+    """
+    :arg code: a position from encode()
+    :arg cls: the class of the game object, rules.Game or a subclass
+    :arg rng: a random.Random instance used by the game object to roll the dice
+
+    :returns a new game object in the position, ready for the dice of the current player to be rolled. Only the
+        parked faces are encoded, not the number of dice per face, so turn.parked holds 1 for every parked face
+    """
+    players = code >> PLAYERS_SHIFT & 7
+    game = cls(players, rng)
+    game.table = {d: v for d, v in DOMINO_VALUES.items() if code >> (d - FIRST_DOMINO) & 1}
+    shift = STACKS_SHIFT
+    for stack in game.stacks:
+        n = code >> shift & 31
+        shift += 5
+        for _ in range(n):
+            stack.append(FIRST_DOMINO + (code >> shift & 15))
+            shift += 4
+    owned = set(game.table).union(*game.stacks)
+    game.flipped = [d for d in sorted(DOMINO_VALUES, reverse=True) if d not in owned]
+    game.reindex()
+    game.current = code >> CURRENT_SHIFT & 7
+    turn = game.turn
+    turn.parked = [code >> (PARKED_SHIFT + f) & 1 for f in range(6)]
+    turn.score = code >> SCORE_SHIFT & 63
+    turn.dice_left = code >> DICE_SHIFT & 15
+    if isinstance(game, HashedGame):
+        game.hash = zobrist(game)
+    return game
+
+
+class ZobristKeys:
+    def __init__(self, seed=0x5EED):
+        """
+        Initializes a ZobristKeys object with a random 64-bit key for every part of a position, the hash of a position
+        is the XOR of the keys of its parts
+
+        :arg seed: seed of the random generator of the keys
+        """
+        rng = random.Random(seed)
+        key = lambda: rng.getrandbits(64)
+        self.table = {d: key() for d in DOMINO_VALUES}
+        self.stack = [[{d: key() for d in DOMINO_VALUES} for _ in range(len(DOMINO_VALUES))]
+                      for _ in range(MAX_PLAYERS)]
+        self.parked = [key() for _ in range(6)]
+        self.score = [key() for _ in range(MAX_SCORE + 1)]
+        self.dice = [key() for _ in range(NUM_DICE + 1)]
+        self.current = [key() for _ in range(MAX_PLAYERS)]
+
+    def turn(self, turn):
+        """:returns the XOR of the keys of the parked faces, score and dice left of a rules.Turn object"""
+        h = self.score[turn.score] ^ self.dice[turn.dice_left]
+        for f in range(6):
+            if turn.parked[f]:
+                h ^= self.parked[f]
+        return h
+
+
+KEYS = ZobristKeys()
+
+
+def zobrist(game):
+    """:returns the Zobrist hash of a rules.Game position, computed from scratch"""
+    h = KEYS.turn(game.turn) ^ KEYS.current[game.current]
+    for d in game.table:
+        h ^= KEYS.table[d]
+    for j, stack in enumerate(game.stacks):
+        for pos, d in enumerate(stack):
+            h ^= KEYS.stack[j][pos][d]
+    return h
+
+
+class HashedGame(Game):
+    """rules.Game that updates the Zobrist hash of its position in self.hash with every move"""
+
+    def __init__(self, players, rng=None):
+        super(HashedGame, self).__init__(players, rng)
+        self.hash = zobrist(self)
+
+    def select_face(self, face):
+        before = KEYS.turn(self.turn)
+        points = super(HashedGame, self).select_face(face)
+        self.hash ^= before ^ KEYS.turn(self.turn)
+        return points
+
+    def stop(self):
+        player = self.current
+        before = KEYS.turn(self.turn) ^ KEYS.current[player]
+        result = super(HashedGame, self).stop()
+        if result is None:
+            return None
+        domino, victim = result
+        h = self.hash ^ before ^ KEYS.turn(self.turn) ^ KEYS.current[self.current]
+        if victim is None:
+            h ^= KEYS.table[domino]
+        else:
+            h ^= KEYS.stack[victim][len(self.stacks[victim])][domino]
+        self.hash = h ^ KEYS.stack[player][len(self.stacks[player]) - 1][domino]
+        return result
+
+    def bust(self):
+        player = self.current
+        before = KEYS.turn(self.turn) ^ KEYS.current[player]
+        returned, flipped = super(HashedGame, self).bust()
+        h = self.hash ^ before ^ KEYS.turn(self.turn) ^ KEYS.current[self.current]
+        if returned is not None:
+            h ^= KEYS.stack[player][len(self.stacks[player])][returned] ^ KEYS.table[returned]
+        if flipped is not None:
+            h ^= KEYS.table[flipped]
+        self.hash = h
+        return returned, flipped
+
+
+class TranspositionTable:
+    def __init__(self, bits=20):
+        """
+        Initializes a TranspositionTable object, a fixed size table of 2 ** bits slots storing one value per position
+        hash. A new entry replaces the entry in its slot
+
+        :arg bits: number of bits of the hash used as slot index
+        """
+        self.mask = (1 << bits) - 1
+        self.keys = [None] * (1 << bits)
+        self.values = [None] * (1 << bits)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, h, default=None):
+        """:returns the value stored for position hash h, or default when not stored"""
+        i = h & self.mask
+        if self.keys[i] == h:
+            self.hits += 1
+            return self.values[i]
+        self.misses += 1
+        return default
+
+    def put(self, h, value):
+        """stores the value of position hash h"""
+        i = h & self.mask
+        self.keys[i] = h
+        self.values[i] = value
+
+    def __len__(self):
+        return len(self.keys) - self.keys.count(None)
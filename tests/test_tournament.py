@@ -0,0 +1,30 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tournament import SPRT, FIRST, SECOND, EQUAL
+
+
+def games_to_conclusion(sprt, x, max_games=1000):
+    """:returns the conclusion of sprt and the number of games after adding x until it concludes"""
+    for n in range(1, max_games + 1):
+        sprt.add(x)
+        if sprt.result() is not None:
+            return sprt.result(), n
+    return None, max_games
+
+
+def test_all_wins_stop_early():
+    assert games_to_conclusion(SPRT(), 1.0) == (FIRST, SPRT.min_games)
+    assert games_to_conclusion(SPRT(), 0.0) == (SECOND, SPRT.min_games)
+
+
+def test_constant_margin_stops_early():
+    result, n = games_to_conclusion(SPRT('margin'), 3.0)
+    assert result == FIRST and n <= 50
+
+
+def test_all_ties_are_equal():
+    result, n = games_to_conclusion(SPRT(), 0.5)
+    assert result == EQUAL and n <= 50
@@ -0,0 +1,357 @@
+import os
+import sys
+import json
+import math
+import argparse
+import importlib
+
+from functools import partial
+from multiprocessing import Pool
+
+from dice import DiceStream, game_seed
+from mcts import MCTSBot
+from rules import GreedyBot, simulate_game
+from solver import SolverBot
+from policy import PolicyBot
+from records import RecordedGame, RecordWriter
+
+MIN_PLAYERS = 2
+MAX_PLAYERS = 6
+
+# bots that can be referred to by name, any other bot is given as 'module:Class'. The tournament already runs on all
+# cores, so the MCTS bot searches in its own worker process. The policy bot reads policy.bin, built by policy.py
+BOTS = {'greedy': GreedyBot, 'solver': SolverBot, 'mcts': partial(MCTSBot, workers=1), 'policy': PolicyBot}
+
+# bot objects of this (worker) process, created once so their caches are shared between games
+_bots = {}
+
+
+def make_bot(name):
+    """:returns a new bot object from a name in BOTS or a 'module:Class' string"""
+    if name in BOTS:
+        return BOTS[name]()
+    module, _, cls = name.partition(':')
+    return getattr(importlib.import_module(module), cls)()
+
+
+def get_bot(name):
+    """:returns the bot object of this process for a bot name"""
+    if name not in _bots:
+        _bots[name] = make_bot(name)
+    return _bots[name]
+
+
+def seating(bots, game, rotate=True):
+    """:returns the list of bot names in the order of play, rotated every game when rotate is True"""
+    if not rotate:
+        return list(bots)
+    shift = game % len(bots)
+    return list(bots[shift:]) + list(bots[:shift])
+
+
+def play_seeded_game(seed, game, bots, rotate=True, record=False):
+    """
+    :arg seed: integer seed of the tournament
+    :arg game: number of the game in the tournament
+    :arg bots: list of bot names, one for each player
+    :arg rotate: boolean, rotate the order of play every game
+    :arg record: boolean, add the events of the game (see records.py) as bytes under the key 'record'
+
+    Plays one complete game without a window, the same seed and game number always give the same game. The dice
+    come from a dice.DiceStream of the game, so every roll of the game can be computed again on its own
+
+    :returns a dictionary with the players in order of play, their worms, the winners and the dominos history
+    """
+    players = seating(bots, game, rotate)
+    rng = DiceStream(game_seed(seed, game))
+    if record:
+        g = simulate_game([get_bot(name) for name in players], rng, RecordedGame, number=game)
+    else:
+        g = simulate_game([get_bot(name) for name in players], rng)
+    worms = [g.worms(p) for p in range(len(players))]
+    result = {'game': game, 'seed': seed, 'players': players, 'worms': worms,
+              'winners': g.winners(),
+              'stacks': g.stacks, 'flipped': g.flipped, 'history': g.history}
+    if record:
+        result['record'] = bytes(g.record.data)
+    return result
+
+
+def _play(args):
+    """pool worker function, see play_seeded_game"""
+    return play_seeded_game(*args)
+
+
+def run_tournament(bots, games, seed=0, workers=None, done=(), rotate=True, record=False):
+    """
+    :arg bots: list of 2 to 6 bot names, one for each player
+    :arg games: number of games in the tournament
+    :arg seed: integer seed of the tournament
+    :arg workers: number of worker processes, by default one per cpu core
+    :arg done: collection of game numbers already played, these are skipped when resuming a tournament
+    :arg rotate: boolean, rotate the order of play every game
+    :arg record: boolean, add the events of every game to the results
+
+    Plays the games of a tournament on a pool of processes
+
+    :returns a generator of the results of play_seeded_game, in the order the games finish
+    """
+    if not MIN_PLAYERS <= len(bots) <= MAX_PLAYERS:
+        raise ValueError(f'a game has {MIN_PLAYERS} to {MAX_PLAYERS} players, not {len(bots)}')
+    todo = [(seed, game, list(bots), rotate, record) for game in range(games) if game not in done]
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        for args in todo:
+            yield _play(args)
+        return
+    chunksize = max(1, len(todo) // (workers * 16))
+    with Pool(workers) as pool:
+        yield from pool.imap_unordered(_play, todo, chunksize)
+
+
+# conclusions of a match
+FIRST, SECOND, EQUAL = 'first', 'second', 'equal'
+
+
+class SPRT:
+
+    # value of a game without a difference between the bots, per metric
+    centers = {'score': 0.5, 'margin': 0.0}
+
+    # games played before the test can stop, the variance of fewer games is not reliable
+    min_games = 16
+
+    def __init__(self, metric='score', delta=None, confidence=0.95):
+        """
+        Initializes a SPRT object, two sequential probability ratio tests of the hypothesis that the bots are equally
+        strong against the hypotheses that the first or the second bot is better by delta. The log-likelihood ratios use
+        the normal approximation with the variance of the games so far, so they work for wins and ties as well as for
+        margins
+
+        :arg metric: 'score' for 1 for a win, 1/2 for a tie and 0 for a loss of the first bot, 'margin' for the worms
+            of the first bot minus the worms of the second bot
+        :arg delta: difference of the mean of the metric from a game without a difference between the bots, by default
+            0.05 for the score and 1 worm for the margin
+        :arg confidence: probability of a correct conclusion
+        """
+        if metric not in SPRT.centers:
+            raise ValueError(f'metric is score or margin, not {metric!r}')
+        self.metric = metric
+        self.center = SPRT.centers[metric]
+        self.delta = delta if delta is not None else (0.05 if metric == 'score' else 1.0)
+        # the error of calling one of the bots better is split between the two tests
+        alpha, beta = (1 - confidence) / 2, 1 - confidence
+        self.lower = math.log(beta / (1 - alpha))
+        self.upper = math.log((1 - beta) / alpha)
+        self.n = 0
+        self.sum = 0.0
+        self.sum2 = 0.0
+
+    def value(self, result, first, second):
+        """:returns the metric of a result of play_seeded_game for the bots named first and second"""
+        a, b = result['players'].index(first), result['players'].index(second)
+        if self.metric == 'margin':
+            return result['worms'][a] - result['worms'][b]
+        winners = result['winners']
+        return (a in winners) / len(winners)
+
+    def add(self, x):
+        """adds the metric of a game"""
+        x -= self.center
+        self.n += 1
+        self.sum += x
+        self.sum2 += x * x
+
+    def mean(self):
+        """:returns the mean of the metric so far"""
+        return self.sum / self.n + self.center if self.n else self.center
+
+    def llr(self):
+        """
+        :returns a tuple with the log-likelihood ratios of the first and of the second bot being better by delta
+            against the bots being equal, (0.0, 0.0) as long as the variance is not known
+        """
+        if self.n < 2:
+            return 0.0, 0.0
+        mean = self.sum / self.n
+        # games that differ less than delta, like a match of only wins, get the variance delta ** 2, so the ratios
+        # still grow with the number of games and a lopsided match stops early
+        variance = max(self.sum2 / self.n - mean * mean, self.delta * self.delta)
+        scale = self.n * self.delta / variance
+        return scale * (mean - self.delta / 2), scale * (-mean - self.delta / 2)
+
+    def result(self):
+        """
+        :returns FIRST or SECOND when that bot is better, EQUAL when neither bot is better by delta, None as long as
+            it is not known
+        """
+        if self.n < SPRT.min_games:
+            return None
+        first, second = self.llr()
+        if first >= self.upper:
+            return FIRST
+        if second >= self.upper:
+            return SECOND
+        if first <= self.lower and second <= self.lower:
+            return EQUAL
+        return None
+
+
+def run_match(bots, test, max_games=100000, seed=0, workers=None, batch=None):
+    """
+    :arg bots: list of two bot names
+    :arg test: SPRT object that decides when to stop
+    :arg max_games: the match stops without conclusion after this number of games
+    :arg seed: integer seed of the match, game g has the dice of game g of run_tournament
+    :arg workers: number of worker processes, by default one per cpu core
+    :arg batch: number of games played in parallel before the test is updated, by default 32 per worker
+
+    Plays games of two bots in parallel batches until the test is conclusive. The results of a batch are added in
+    the order of the games and the match stops at the first conclusive game, so the conclusion and the number of
+    games do not depend on the number of workers
+
+    :returns a tuple (conclusion, results): the result of the test (see SPRT.result, None without conclusion) and the
+        list of the results of play_seeded_game up to the game that decided the match
+    """
+    if len(bots) != 2 or bots[0] == bots[1]:
+        raise ValueError('a match is played by two different bots')
+    workers = workers or os.cpu_count()
+    batch = batch or 32 * workers
+    results = []
+    pool = Pool(workers) if workers > 1 else None
+    try:
+        for start in range(0, max_games, batch):
+            todo = [(seed, game, list(bots)) for game in range(start, min(start + batch, max_games))]
+            if pool is None:
+                played = [_play(args) for args in todo]
+            else:
+                played = pool.map(_play, todo, max(1, len(todo) // (workers * 4)))
+            for result in played:
+                results.append(result)
+                test.add(test.value(result, bots[0], bots[1]))
+                conclusion = test.result()
+                if conclusion is not None:
+                    return conclusion, results
+    finally:
+        if pool is not None:
+            pool.terminate()
+    return None, results
+
+
+def read_results(path):
+    """:returns a generator of the results stored in a tournament file, skipping an incomplete last line"""
+    if not os.path.exists(path):
+        return
+    with open(path) as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                return
+
+
+def cut_partial_line(path, block=1 << 16):
+    """cuts the incomplete last line an interrupted run may have left at the end of a tournament file"""
+    with open(path, 'rb+') as f:
+        end = f.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(end - block, 0)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b'\n')
+            if newline >= 0:
+                f.truncate(start + newline + 1)
+                return
+            end = start
+        f.truncate(0)
+
+
+class Standings:
+    def __init__(self):
+        """Initializes a Standings object that collects the wins and worms of each bot over the games of a tournament"""
+        self.games = 0
+        self.wins = {}
+        self.worms = {}
+        self.played = {}
+
+    def add(self, result):
+        """:arg result: a result of play_seeded_game, a shared win counts as a part of a win for each winner"""
+        self.games += 1
+        for p, name in enumerate(result['players']):
+            self.played[name] = self.played.get(name, 0) + 1
+            self.worms[name] = self.worms.get(name, 0) + result['worms'][p]
+            if p in result['winners']:
+                self.wins[name] = self.wins.get(name, 0) + 1 / len(result['winners'])
+
+    def __str__(self):
+        lines = [f'{self.games} games']
+        for name in sorted(self.played, key=lambda n: -self.wins.get(n, 0)):
+            lines.append(f'{name:>20}: {self.wins.get(name, 0):10.1f} wins, '
+                         f'{self.worms[name] / self.played[name]:5.2f} worms per game')
+        return '\n'.join(lines)
+
+
+def main(argv=None):
+    """command line entry point, plays a tournament and stores every result as a line of JSON in the output file"""
+    parser = argparse.ArgumentParser(description='Play a Regenwormen tournament between bots without a window')
+    parser.add_argument('bots', nargs='+', help="bot names (greedy, solver, mcts, policy) or 'module:Class', one for "
+                                                "each player")
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--no-rotate', dest='rotate', action='store_false', help='keep the same order of play')
+    parser.add_argument('--out', default='tournament.jsonl', help='results file, an existing file is resumed')
+    parser.add_argument('--record', help='also append the events of the games to this game record file')
+    parser.add_argument('--match', action='store_true',
+                        help='play two bots until a sequential test is conclusive, --games is the maximum')
+    parser.add_argument('--metric', choices=sorted(SPRT.centers), default='score',
+                        help='wins (score) or worm margin (margin) of the first bot')
+    parser.add_argument('--delta', type=float, default=None, help='difference of the metric the match detects')
+    parser.add_argument('--confidence', type=float, default=0.95)
+    parser.add_argument('--batch', type=int, default=None, help='number of games played in parallel in a match')
+    args = parser.parse_args(argv)
+
+    if args.match:
+        if len(args.bots) != 2 or args.bots[0] == args.bots[1]:
+            parser.error('a match is played by two different bots')
+        test = SPRT(args.metric, args.delta, args.confidence)
+        conclusion, results = run_match(args.bots, test, args.games, args.seed, args.workers, args.batch)
+        standings = Standings()
+        for result in results:
+            standings.add(result)
+        print(standings)
+        texts = {FIRST: f'{args.bots[0]} is better', SECOND: f'{args.bots[1]} is better',
+                 EQUAL: f'no difference of {test.delta}', None: 'no conclusion'}
+        first, second = test.llr()
+        print(f'{texts[conclusion]} after {test.n} games at confidence {args.confidence}: mean {args.metric} of '
+              f'{args.bots[0]} {test.mean():.3f}, log-likelihood ratios {first:.2f} and {second:.2f} '
+              f'(bounds {test.lower:.2f}, {test.upper:.2f})')
+        return
+    writer = RecordWriter(args.record) if args.record else None
+
+    # resume from the results already stored, the stored lines are kept as they are and new results are appended
+    standings = Standings()
+    done = set()
+    if os.path.exists(args.out):
+        cut_partial_line(args.out)
+    for result in read_results(args.out):
+        if result['seed'] == args.seed:
+            done.add(result['game'])
+            standings.add(result)
+    with open(args.out, 'a') as f:
+        for result in run_tournament(args.bots, args.games, args.seed, args.workers, done, args.rotate,
+                                     writer is not None):
+            # the result is stored before the record, a game recorded twice would count twice in the analytics, so
+            # a run stopped in between loses the record of that game instead
+            record = result.pop('record', None)
+            f.write(json.dumps(result) + '\n')
+            f.flush()
+            if writer is not None:
+                writer.write(record)
+            standings.add(result)
+    if writer is not None:
+        writer.close()
+    print(standings)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])